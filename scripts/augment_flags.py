@@ -1,7 +1,9 @@
 import argparse
+import numpy as np
 import pandas as pd
 import logging
-from utils import load_config
+from utils import load_config, normalize_string, normalize_strings, normalize_cache_stats
+from storage import read_table, write_table
 import re
 
 def setup_logging():
@@ -14,30 +16,53 @@ def setup_logging():
 
 def load_list(path):
     try:
-        return set(pd.read_csv(path, header=None)[0].astype(str).str.upper())
+        # Normalized like the assignee names they are compared with
+        return set(pd.read_csv(path, header=None)[0].astype(str).map(normalize_string))
     except Exception:
         return set()
 
+# Regex for legal forms
+COMPANY_PATTERN = re.compile(r"\b(?:SL|SA|SLU|SLL|GMBH|LTD|LLC|INC|CORP|SAS|BV|AG|PLC|SPA)\b")
+
 def is_company(name, whitelist):
-    # Regex for legal forms
-    company_regex = r"\\b(SL|SA|SLU|SLL|GMBH|LTD|LLC|INC|CORP|SAS|BV|AG|PLC|SPA)\\b"
-    name_norm = name.upper()
+    name_norm = normalize_string(name)
     if name_norm in whitelist:
         return False
-    return bool(re.search(company_regex, name_norm))
+    return bool(COMPANY_PATTERN.search(name_norm))
 
-def apply_flags(df, whitelist, blacklist, config):
-    logging.info("Applying Venture Builder flags...")
+def explode_names(assignees):
+    """One normalized assignee per row, indexed by the row position in assignees.
+
+    Accepts lists (in-process and columnar inputs) and newline-separated strings (Excel).
+    """
+    names = assignees.reset_index(drop=True).map(
+        lambda v: v if isinstance(v, list) else str(v).split('\n')).explode()
+    return normalize_strings(names.dropna().astype(str))
+
+def company_coowner_flag(assignees, whitelist):
+    """1 where any assignee has a legal form and is not whitelisted (one vectorized pass)."""
+    names = explode_names(assignees)
+    is_co = names.str.contains(COMPANY_PATTERN) & ~names.isin(whitelist)
+    flag = is_co.groupby(level=0).any().reindex(range(len(assignees)), fill_value=False)
+    return pd.Series(flag.astype(int).to_numpy(), index=assignees.index)
+
+def _column(df, col, default):
+    return df[col] if col in df.columns else pd.Series(default, index=df.index)
+
+def holder_flags(df, whitelist):
+    """Per-family flags that only depend on the family's own fields (assignees, status)."""
     # Industry_CoOwner_Flag
-    df['Industry_CoOwner_Flag'] = df['Assignee Details Name'].apply(
-        lambda names: int(any(is_company(n, whitelist) for n in str(names).split('\n')))
-    )
+    df['Industry_CoOwner_Flag'] = company_coowner_flag(df['Assignee Details Name'], whitelist)
     # Alive_Flag
     if 'Dead or Alive' in df.columns:
         df['Alive_Flag'] = df['Dead or Alive'].astype(str).str.upper().map({'ALIVE': 1, 'DEAD': 0}).fillna(0).astype(int)
     # Litigation_Flag
     if 'Litigation Exists' in df.columns:
         df['Litigation_Flag'] = df['Litigation Exists'].astype(str).str.upper().map({'YES': 1, 'NO': 0}).fillna(0).astype(int)
+    return df
+
+def eligibility_flags(df, config):
+    """VB_Eligible and VB_Exclusion_Reason from the holder flags and Freshness_Flag."""
     # VB_Eligible
     df['VB_Eligible'] = (
         (df['Industry_CoOwner_Flag'] == 0) &
@@ -45,30 +70,38 @@ def apply_flags(df, whitelist, blacklist, config):
         ((df.get('Alive_Flag', 1) == 1) if config['eligibility'].get('require_alive', False) else True) &
         ((df.get('Litigation_Flag', 0) == 0) if config['eligibility'].get('exclude_litigation', False) else True)
     ).astype(int)
-    # VB_Exclusion_Reason
-    def exclusion_reason(row):
-        if row['Industry_CoOwner_Flag'] == 1:
-            return 'company_coprop'
-        if row.get('Freshness_Flag', 1) == 0:
-            return 'stale_ip'
-        if row.get('Alive_Flag', 1) == 0:
-            return 'dead'
-        if row.get('Litigation_Flag', 0) == 1:
-            return 'litigation'
-        return 'other'
-    df['VB_Exclusion_Reason'] = df.apply(lambda row: exclusion_reason(row) if row['VB_Eligible'] == 0 else '', axis=1)
+    # VB_Exclusion_Reason: first matching rule, only for non-eligible families
+    reason = np.select(
+        [
+            df['Industry_CoOwner_Flag'] == 1,
+            _column(df, 'Freshness_Flag', 1) == 0,
+            _column(df, 'Alive_Flag', 1) == 0,
+            _column(df, 'Litigation_Flag', 0) == 1,
+        ],
+        ['company_coprop', 'stale_ip', 'dead', 'litigation'],
+        default='other',
+    )
+    df['VB_Exclusion_Reason'] = np.where(df['VB_Eligible'] == 0, reason, '')
+    return df
+
+def apply_flags(df, whitelist, blacklist, config):
+    logging.info("Applying Venture Builder flags...")
+    df = eligibility_flags(holder_flags(df, whitelist), config)
+    stats = normalize_cache_stats()
+    if stats['hit_rate'] is not None:
+        logging.info(f"Name normalization cache hit rate: {stats['hit_rate']:.1%} ({stats['size']} entries).")
     logging.info("Flags applied.")
     return df
 
 def process(input_path, output_path, whitelist_path, blacklist_path, config_path):
     logging.info(f"Reading input file: {input_path}")
-    df = pd.read_excel(input_path)
+    df = read_table(input_path)
     config = load_config(config_path)
     whitelist = load_list(whitelist_path)
     blacklist = load_list(blacklist_path)
     df = apply_flags(df, whitelist, blacklist, config)
     logging.info(f"Saving output to: {output_path}")
-    df.to_excel(output_path, index=False)
+    write_table(df, output_path)
     logging.info("Venture Builder flagging completed.")
 
 def main():
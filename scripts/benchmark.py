@@ -0,0 +1,169 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import instrument
+import parse_patents
+import compute_fit_index
+import augment_flags
+import map_to_missions
+import delta_report
+import sensitivity
+import generate_charts
+from storage import read_table
+from synthetic_export import generate_export, write_export
+from utils import load_config
+
+# Benchmark del pipeline sobre exports sintéticos.
+# Cada etapa se mide con instrument.span (como en el manifest de producción) a varias
+# escalas; los resultados se añaden a data/benchmarks/results.jsonl con una etiqueta
+# (por defecto, el commit actual) para comparar una versión con otra.
+
+BENCH_DIR = 'data/benchmarks'
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+STAGES = ['read', 'parse', 'dedupe', 'fit', 'flags', 'map', 'delta', 'sensitivity', 'charts']
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+def current_label():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'local'
+
+def synthetic_input(rows, seed, bench_dir):
+    """Export sintético de `rows` filas en CSV, generado una vez y reutilizado."""
+    path = os.path.join(bench_dir, f"synthetic_{rows}_{seed}.csv")
+    if not os.path.exists(path):
+        logging.info(f"Generando export sintético de {rows} filas: {path}")
+        os.makedirs(bench_dir, exist_ok=True)
+        write_export(generate_export(rows, seed), path)
+    return path
+
+def previous_snapshot(df, thresholds, seed):
+    """Snapshot 'del mes anterior': sin un 5% de familias y con el Fit Index desplazado."""
+    rng = np.random.default_rng(seed)
+    previous = df[rng.random(len(df)) >= 0.05].copy()
+    previous['TRL_Fit_Index'] = (previous['TRL_Fit_Index'] + rng.normal(0, 10, len(previous))).clip(0, 100)
+    previous = compute_fit_index.assign_categories(previous, thresholds)
+    flip = rng.random(len(previous)) < 0.02
+    previous.loc[flip, 'VB_Eligible'] = 1 - previous.loc[flip, 'VB_Eligible']
+    return previous
+
+def family_codes(rows, families):
+    """families con 'CPC/IPC Codes': los códigos distintos de las filas de cada familia.
+
+    dedupe_family no conserva esa columna, así que sin esto el mapeo solo vería M0.
+    """
+    codes = rows['CPC/IPC Codes'].fillna('').astype(str).str.replace(';', ',').str.split(',')
+    codes.index = parse_patents.family_keys(rows).to_numpy()
+    codes = codes.explode().str.strip()
+    codes = codes[codes.astype(bool)].rename_axis('family_key').reset_index().drop_duplicates()
+    joined = codes.groupby('family_key', sort=False)['CPC/IPC Codes'].agg('; '.join)
+    return families.assign(**{'CPC/IPC Codes': families['family_key'].map(joined).fillna('').to_numpy()})
+
+def run_benchmark(rows, config, seed=0, bench_dir=BENCH_DIR, workers=None):
+    """Mide cada etapa sobre un export sintético de `rows` filas; devuelve una medición por etapa."""
+    path = synthetic_input(rows, seed, bench_dir)
+    paths = config.get('paths', {})
+    run = instrument.start_run(f"bench_{rows}")
+    try:
+        with instrument.span('read', reads=[path]) as record:
+            df = read_table(path)
+            record['rows_out'] = len(df)
+        with instrument.span('parse', rows_in=len(df)) as record:
+            df = parse_patents.clean_rows(df)
+            record['rows_out'] = len(df)
+        rows_df = df
+        with instrument.span('dedupe', rows_in=len(df)) as record:
+            df = parse_patents.dedupe_family(df)
+            record['rows_out'] = len(df)
+        # Fuera de las mediciones: el mapeo necesita los códigos CPC de cada familia
+        df = family_codes(rows_df, df)
+        del rows_df
+        with instrument.span('fit', rows_in=len(df)) as record:
+            df = compute_fit_index.score(df, config)
+            record['rows_out'] = len(df)
+        with instrument.span('flags', rows_in=len(df)) as record:
+            whitelist = augment_flags.load_list(paths.get('whitelist'))
+            blacklist = augment_flags.load_list(paths.get('blacklist'))
+            df = augment_flags.apply_flags(df, whitelist, blacklist, config)
+            record['rows_out'] = len(df)
+        with instrument.span('map', rows_in=len(df)) as record:
+            # Sin la caché persistente de códigos: se mide la resolución completa
+            df = map_to_missions.map_missions(df, map_to_missions.load_cpc_map(paths['cpc_map']))
+            record['rows_out'] = len(df)
+        mapped_share = float(df['Primary_Mission'].ne('M0').mean()) if len(df) else 0.0
+        previous = previous_snapshot(df, config['thresholds'], seed)
+        with instrument.span('delta', rows_in=len(df)) as record:
+            tabs = delta_report.build_delta(df, previous)
+            record['rows_out'] = sum(len(tab) for tab in tabs.values())
+        with instrument.span('sensitivity', rows_in=len(df)) as record:
+            record['rows_out'] = len(sensitivity.sensitivity_table(df, config))
+        with tempfile.TemporaryDirectory() as outdir:
+            with instrument.span('charts', rows_in=len(df), writes=[outdir]):
+                generate_charts.render_charts(df, outdir, workers)
+    finally:
+        timing = instrument.finish_run(run)
+    # La proporción mapeada acompaña a 'map' para comprobar que la etapa no es trivial
+    extra = {'map': {'mapped_share': mapped_share}}
+    return [dict(stage, rows=rows, families=len(df), **extra.get(stage['name'], {}))
+            for stage in timing['stages'] if stage['name'] in STAGES]
+
+def save_results(results, label, results_path):
+    os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+    timestamp = datetime.now().isoformat()
+    with open(results_path, 'a') as f:
+        for result in results:
+            f.write(json.dumps(dict(result, label=label, timestamp=timestamp), default=str) + '\n')
+
+def load_results(results_path):
+    if not os.path.exists(results_path):
+        return pd.DataFrame()
+    return pd.read_json(results_path, lines=True, dtype={'label': str})
+
+def compare(results, label, baseline):
+    """Tiempo de reloj por escala y etapa de `label` frente a `baseline` (última medición de cada una)."""
+    latest = (results[results['label'].isin([label, baseline])]
+              .sort_values('timestamp').groupby(['label', 'rows', 'name']).last()['wall_sec'].unstack('label'))
+    latest = latest.reindex(columns=[baseline, label])
+    latest['ratio'] = latest[label] / latest[baseline]
+    order = {name: i for i, name in enumerate(STAGES)}
+    return latest.sort_index(level=['rows', 'name'], key=lambda idx: idx.map(order) if idx.name == 'name' else idx)
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic exports.")
+    parser.add_argument('--config', default='config.yaml', help='Config YAML path')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='Scales to run (rows)')
+    parser.add_argument('--seed', type=int, default=0, help='Synthetic export seed')
+    parser.add_argument('--label', help='Label stored with the results (default: current git commit)')
+    parser.add_argument('--baseline', help='Compare with the results stored under this label')
+    parser.add_argument('--results', default=os.path.join(BENCH_DIR, 'results.jsonl'), help='Results JSON-lines file')
+    parser.add_argument('--workers', type=int, help='Processes used to render the charts')
+    args = parser.parse_args()
+    config = load_config(args.config)
+    label = args.label or current_label()
+    bench_dir = os.path.dirname(args.results) or '.'
+    for rows in args.rows:
+        logging.info(f"Benchmark con {rows} filas")
+        results = run_benchmark(rows, config, args.seed, bench_dir, args.workers)
+        save_results(results, label, args.results)
+        table = pd.DataFrame(results).set_index('name')[['wall_sec', 'cpu_sec', 'peak_rss_mb', 'rows_in', 'rows_out']]
+        logging.info(f"Resultados ({rows} filas, {label}):\n{table.to_string()}")
+    if args.baseline:
+        logging.info(f"Comparación con {args.baseline}:\n{compare(load_results(args.results), label, args.baseline).to_string()}")
+
+if __name__ == "__main__":
+    main()
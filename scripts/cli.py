@@ -1,9 +1,17 @@
 import argparse
-import sys
-import subprocess
+import logging
+import os
 
 # Placeholder for cli.py
 # CLI alternative to run_all.py with subcommands.
+# Stage modules are imported lazily and run inside this interpreter.
+
+def history_config_dir(config_path, name):
+    """History location from the config (paths.history_dir / paths.mission_counts_dir), as the pipeline reads it."""
+    import history
+    from utils import load_config
+    config = load_config(config_path) if config_path and os.path.exists(config_path) else None
+    return history.history_dir(config) if name == 'history_dir' else history.mission_counts_dir(config)
 
 def main():
     parser = argparse.ArgumentParser(description="Radar Tech Pipeline CLI")
@@ -14,6 +22,7 @@ def main():
     parse_parser.add_argument('--input', required=True, help='Input Excel file path')
     parse_parser.add_argument('--output', required=True, help='Output cleaned Excel file path')
     parse_parser.add_argument('--config', required=False, help='Config YAML path')
+    parse_parser.add_argument('--chunksize', type=int, required=False, help='Stream the input in chunks of this many rows')
 
     # Compute fit index subcommand
     fit_parser = subparsers.add_parser('fit', help='Compute TRL2–4 Fit Index and assign categories')
@@ -38,7 +47,7 @@ def main():
 
     # Export views subcommand
     export_parser = subparsers.add_parser('export', help='Export internal and public views from processed data')
-    export_parser.add_argument('--input', required=True, help='Input processed Excel file path')
+    export_parser.add_argument('--input', required=True, help='Input processed file path (.parquet, .feather or .xlsx)')
     export_parser.add_argument('--public', required=True, help='Output public CSV file path')
     export_parser.add_argument('--config', required=True, help='Config YAML path')
 
@@ -47,18 +56,63 @@ def main():
     charts_parser.add_argument('--input', required=True, help='Input processed Excel file path')
     charts_parser.add_argument('--period', required=True, help='Period (YYYY_MM)')
     charts_parser.add_argument('--outdir', required=True, help='Output directory for figures')
+    charts_parser.add_argument('--config', required=True, help='Config YAML path')
+    charts_parser.add_argument('--public', required=False, help='Public CSV path (default: next to the input)')
+    charts_parser.add_argument('--delta', required=False, help='Monthly update Excel path (default: next to the input)')
+    charts_parser.add_argument('--manifest', required=False,
+                               help='Run manifest JSON path (default: logs/run_manifest_<period>.json)')
+    charts_parser.add_argument('--workers', type=int, required=False, help='Processes used to render the figures')
+    charts_parser.add_argument('--engine', choices=['matplotlib', 'native'], required=False,
+                               help='native: Excel charts bound to the sheet data, no matplotlib')
 
     # Delta report subcommand
     delta_parser = subparsers.add_parser('delta', help='Generate Monthly Update delta report')
     delta_parser.add_argument('--current', required=True, help='Current processed Excel file path')
-    delta_parser.add_argument('--previous-snapshot', required=True, help='Previous snapshot Excel file path')
+    delta_parser.add_argument('--previous-snapshot', required=False, help='Previous snapshot file path (overrides the history)')
     delta_parser.add_argument('--delta-out', required=True, help='Output Excel file path for delta report')
+    delta_parser.add_argument('--period', required=False, help='Current period (YYYY_MM); the previous one is taken from the history')
+    delta_parser.add_argument('--history-dir', help='History dataset root (default: paths.history_dir in the config)')
+    delta_parser.add_argument('--config', default='config.yaml', help='Config YAML path (history locations)')
+    delta_parser.add_argument('--back', type=int, default=1, help='Compare against the period this many snapshots back')
+
+    # History subcommand
+    history_parser = subparsers.add_parser('history', help='Append a processed snapshot to the history')
+    history_parser.add_argument('--input', required=True, help='Processed internal table path')
+    history_parser.add_argument('--period', required=True, help='Period (YYYY_MM)')
+    history_parser.add_argument('--history-dir', help='History dataset root (default: paths.history_dir in the config)')
+    history_parser.add_argument('--counts-dir',
+                                help='Mission count aggregates root (default: paths.mission_counts_dir in the config)')
+    history_parser.add_argument('--config', default='config.yaml', help='Config YAML path (history locations)')
+
+    # Trends subcommand
+    trends_parser = subparsers.add_parser('trends', help='Multi-period trends from the snapshot history')
+    trends_parser.add_argument('--output', required=True, help='Output Excel file path')
+    trends_parser.add_argument('--history-dir', help='History dataset root (default: paths.history_dir in the config)')
+    trends_parser.add_argument('--counts-dir',
+                               help='Mission count aggregates root (default: paths.mission_counts_dir in the config)')
+    trends_parser.add_argument('--config', default='config.yaml', help='Config YAML path (history locations)')
+    trends_parser.add_argument('--last', type=int, help='Only the most recent N periods (e.g. 24)')
+    trends_parser.add_argument('--periods', nargs='+', help='Explicit list of periods (YYYY_MM)')
+    trends_parser.add_argument('--from-period', help='Transition matrix start period (default: second to last)')
+    trends_parser.add_argument('--to-period', help='Transition matrix end period (default: last)')
+    trends_parser.add_argument('--family', action='append', help='Restrict trajectories to this family_key (repeatable)')
 
     # Sensitivity analysis subcommand
     sens_parser = subparsers.add_parser('sensitivity', help='Sensitivity analysis of TRL2–4 Fit Index weights')
     sens_parser.add_argument('--input', required=True, help='Input processed Excel file path')
     sens_parser.add_argument('--config', required=True, help='Config YAML path')
     sens_parser.add_argument('--output', required=True, help='Output Excel file path for sensitivity results')
+    sens_parser.add_argument('--mode', choices=['oat', 'grid', 'dirichlet'], default='oat',
+                             help='oat: one weight at a time (default); grid: every combination of deltas; '
+                                  'dirichlet: random weight draws with per-family stability')
+    sens_parser.add_argument('--steps', type=int, default=5, help='Number of deltas per weight')
+    sens_parser.add_argument('--span', type=float, default=0.2, help='Maximum relative change per weight (0.2 = +/-20%%)')
+    sens_parser.add_argument('--draws', type=int, default=1000, help='Number of Dirichlet weight draws')
+    sens_parser.add_argument('--concentration', type=float, default=100.0,
+                             help='Dirichlet concentration; higher keeps draws closer to the config weights')
+    sens_parser.add_argument('--seed', type=int, default=0, help='Random seed for the Dirichlet draws')
+    sens_parser.add_argument('--memory-mb', type=int, default=256, help='Memory budget per evaluation block (MB)')
+    sens_parser.add_argument('--workers', type=int, default=1, help='Worker processes for the scenario sweep')
 
     # Generate manifest subcommand
     manifest_parser = subparsers.add_parser('manifest', help='Generate pipeline run manifest')
@@ -68,37 +122,79 @@ def main():
     manifest_parser.add_argument('--period', required=True, help='Period (YYYY_MM)')
     manifest_parser.add_argument('--version', required=True, help='Pipeline version string')
 
+    # Full in-process pipeline subcommand
+    run_parser = subparsers.add_parser('run', help='Run the full pipeline in a single process')
+    run_parser.add_argument('--input', required=True, help='Input Excel file path')
+    run_parser.add_argument('--period', required=True, help='Period (YYYY_MM)')
+    run_parser.add_argument('--config', required=True, help='Config YAML path')
+    run_parser.add_argument('--checkpoint', action='append', default=[], choices=['cleaned', 'fit_index', 'flags'],
+                            help='Intermediate output to write to disk (repeatable)')
+    run_parser.add_argument('--chunksize', type=int, required=False, help='Stream the input in chunks of this many rows')
+    run_parser.add_argument('--incremental', action='store_true',
+                            help='Only re-score families that are new or changed since the previous snapshot')
+    run_parser.add_argument('--workers', type=int, help='Processes for the independent tail stages')
+    run_parser.add_argument('--trace', help='Append per-stage timing spans to this JSON-lines file')
+    run_parser.add_argument('--no-cache', action='store_true', help='Recompute every stage instead of reusing the stage cache')
+
     args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
 
     if args.command == 'parse':
-        cmd = [sys.executable, 'scripts/parse_patents.py', '--input', args.input, '--output', args.output]
+        from parse_patents import clean_and_parse
+        config = None
         if args.config:
-            cmd += ['--config', args.config]
-        subprocess.run(cmd)
+            from utils import load_config
+            config = load_config(args.config)
+        clean_and_parse(args.input, args.output, config, args.chunksize)
     elif args.command == 'fit':
-        cmd = [sys.executable, 'scripts/compute_fit_index.py', '--input', args.input, '--output', args.output, '--config', args.config]
-        subprocess.run(cmd)
+        from compute_fit_index import process
+        process(args.input, args.output, args.config)
     elif args.command == 'flags':
-        cmd = [sys.executable, 'scripts/augment_flags.py', '--input', args.input, '--output', args.output, '--whitelist', args.whitelist, '--blacklist', args.blacklist, '--config', args.config]
-        subprocess.run(cmd)
+        from augment_flags import process
+        process(args.input, args.output, args.whitelist, args.blacklist, args.config)
     elif args.command == 'map':
-        cmd = [sys.executable, 'scripts/map_to_missions.py', '--input', args.input, '--output', args.output, '--cpc-map', args.cpc_map, '--config', args.config]
-        subprocess.run(cmd)
+        from map_to_missions import process
+        process(args.input, args.output, args.cpc_map, args.config)
     elif args.command == 'export':
-        cmd = [sys.executable, 'scripts/export_views.py', '--input', args.input, '--public', args.public, '--config', args.config]
-        subprocess.run(cmd)
+        from export_views import process, internal_output_path
+        process(args.input, internal_output_path(args.input), args.public, args.config)
     elif args.command == 'charts':
-        cmd = [sys.executable, 'scripts/generate_charts.py', '--input', args.input, '--period', args.period, '--outdir', args.outdir]
-        subprocess.run(cmd)
+        from generate_charts import process
+        process(args.input, args.period, args.outdir, args.config, args.workers, args.engine, args.public,
+                args.delta, args.manifest)
     elif args.command == 'delta':
-        cmd = [sys.executable, 'scripts/delta_report.py', '--current', args.current, '--previous-snapshot', args.previous_snapshot, '--delta-out', args.delta_out]
-        subprocess.run(cmd)
+        from delta_report import delta_report
+        if not args.previous_snapshot and not args.period:
+            parser.error('delta needs --previous-snapshot or --period')
+        history_dir = args.history_dir or history_config_dir(args.config, 'history_dir')
+        delta_report(args.current, args.previous_snapshot, args.delta_out, args.period, history_dir, args.back)
+    elif args.command == 'history':
+        from history import append_snapshot
+        from storage import read_table
+        append_snapshot(read_table(args.input), args.history_dir or history_config_dir(args.config, 'history_dir'),
+                        args.period, args.counts_dir or history_config_dir(args.config, 'mission_counts_dir'))
+    elif args.command == 'trends':
+        from trends import trends_report
+        trends_report(args.history_dir or history_config_dir(args.config, 'history_dir'),
+                      args.counts_dir or history_config_dir(args.config, 'mission_counts_dir'),
+                      args.output, args.last, args.periods, args.from_period, args.to_period, args.family)
     elif args.command == 'sensitivity':
-        cmd = [sys.executable, 'scripts/sensitivity.py', '--input', args.input, '--config', args.config, '--output', args.output]
-        subprocess.run(cmd)
+        from sensitivity import sensitivity_analysis
+        sensitivity_analysis(args.input, args.config, args.output, mode=args.mode, steps=args.steps, span=args.span,
+                             draws=args.draws, concentration=args.concentration, seed=args.seed,
+                             max_block_mb=args.memory_mb, workers=args.workers)
     elif args.command == 'manifest':
-        cmd = [sys.executable, 'scripts/generate_manifest.py', '--input', args.input, '--config', args.config, '--output', args.output, '--period', args.period, '--version', args.version]
-        subprocess.run(cmd)
+        from generate_manifest import manifest
+        manifest(args.input, args.config, args.output, args.period, args.version)
+    elif args.command == 'run':
+        from pipeline import run_pipeline
+        run_pipeline(args.input, args.period, args.config, checkpoints=args.checkpoint, chunksize=args.chunksize,
+                     incremental_run=args.incremental, use_cache=not args.no_cache,
+                     workers=args.workers, trace_path=args.trace)
     else:
         parser.print_help()
 
@@ -2,6 +2,7 @@ import argparse
 import pandas as pd
 import logging
 from utils import load_config
+from storage import read_table, write_table
 
 def setup_logging():
     logging.basicConfig(
@@ -47,16 +48,17 @@ def assign_categories(df, thresholds):
     )
     return df
 
+def score(df, config):
+    df = compute_fit_index(df, config['weights'])
+    return assign_categories(df, config['thresholds'])
+
 def process(input_path, output_path, config_path):
     logging.info(f"Reading input file: {input_path}")
-    df = pd.read_excel(input_path)
+    df = read_table(input_path)
     config = load_config(config_path)
-    weights = config['weights']
-    thresholds = config['thresholds']
-    df = compute_fit_index(df, weights)
-    df = assign_categories(df, thresholds)
+    df = score(df, config)
     logging.info(f"Saving output to: {output_path}")
-    df.to_excel(output_path, index=False)
+    write_table(df, output_path)
     logging.info("TRL2–4 Fit Index calculation completed.")
 
 def main():
@@ -1,7 +1,11 @@
 import argparse
+import numpy as np
 import pandas as pd
 import logging
 import os
+from storage import read_table
+import history
+from incremental import FINGERPRINT_COLUMN
 
 def setup_logging():
     logging.basicConfig(
@@ -14,56 +18,157 @@ def load_data(path):
     if not os.path.exists(path):
         logging.warning(f"Archivo previo no encontrado: {path}. Se asumirá que no hay datos previos.")
         return pd.DataFrame()
-    return pd.read_excel(path)
+    return read_table(path)
 
-def get_family_key(df):
-    return df['family_key'] if 'family_key' in df.columns else df.index
+def load_previous(period=None, history_root=None, previous_path=None, back=1):
+    """Snapshot previo: el fichero indicado o, si no hay, el periodo anterior del histórico.
 
-def delta_report(current_path, previous_path, out_path):
-    logging.info(f"Leyendo archivo actual: {current_path}")
-    current = load_data(current_path)
-    logging.info(f"Leyendo snapshot previo: {previous_path}")
-    previous = load_data(previous_path)
-    # NEW: familias en actual que no estaban en previo
-    new_families = set(get_family_key(current)) - set(get_family_key(previous))
-    df_new = current[current['family_key'].isin(new_families)]
-    # DROPPED: familias en previo que no están en actual
-    dropped_families = set(get_family_key(previous)) - set(get_family_key(current))
-    df_dropped = previous[previous['family_key'].isin(dropped_families)] if not previous.empty else pd.DataFrame()
-    # UPGRADED: B->A o C->A
-    if not previous.empty:
-        upgraded = current.merge(previous[['family_key', 'TRL_Category']], on='family_key', suffixes=('', '_prev'))
-        df_upgraded = upgraded[((upgraded['TRL_Category_prev'] != 'A') & (upgraded['TRL_Category'] == 'A'))]
-        # DOWNGRADED: A->B/C o B->C
-        df_downgraded = upgraded[((upgraded['TRL_Category_prev'] == 'A') & (upgraded['TRL_Category'] != 'A')) |
-                                 ((upgraded['TRL_Category_prev'] == 'B') & (upgraded['TRL_Category'] == 'C'))]
-        # EXCLUDED_BY_RULE: VB_Eligible pasó de 1 a 0
-        excluded = current.merge(previous[['family_key', 'VB_Eligible']], on='family_key', suffixes=('', '_prev'))
-        df_excluded = excluded[(excluded['VB_Eligible_prev'] == 1) & (excluded['VB_Eligible'] == 0)]
+    Sin la huella de las ejecuciones incrementales, que no forma parte de la tabla interna.
+    """
+    if previous_path:
+        logging.info(f"Leyendo snapshot previo: {previous_path}")
+        previous = load_data(previous_path)
+    else:
+        prev = history.previous_period(history_root, period, back) if history_root and period else None
+        if prev is None:
+            logging.warning(f"Sin periodo previo a {period} en el histórico. Se asumirá que no hay datos previos.")
+            return pd.DataFrame()
+        logging.info(f"Leyendo snapshot {prev} del histórico: {history_root}")
+        previous = history.read_snapshot(history_root, prev)
+    return previous.drop(columns=[FINGERPRINT_COLUMN], errors='ignore')
+
+# Campos comparados entre snapshots para el registro de cambios. TRL_Fit_Index no se
+# compara: está normalizado por el máximo de la cohorte y un cambio de ese máximo
+# movería la puntuación de casi todas las familias
+CHANGE_FIELDS = ['TRL_Category', 'VB_Eligible', 'VB_Exclusion_Reason', 'Primary_Mission']
+
+def require_family_key(df, label):
+    if 'family_key' not in df.columns:
+        raise ValueError(f"El snapshot {label} no tiene la columna 'family_key'")
+
+def join_snapshots(current, previous):
+    """Outer hash join de ambos snapshots por family_key, con indicador _merge.
+
+    Las claves se factorizan una sola vez (sin ordenar): primero van las filas actuales
+    en su orden (_row, y _row_prev = -1 si son nuevas) y después las del previo que
+    ya no están. Los campos comparados llevan sufijo _prev para el previo.
+    """
+    fields = [f for f in CHANGE_FIELDS if f in current.columns and f in previous.columns]
+    keys = pd.concat([current['family_key'], previous['family_key']], ignore_index=True)
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    cur_codes, prev_codes = codes[:len(current)], codes[len(current):]
+    if previous['family_key'].duplicated().any():
+        logging.warning("family_key duplicado en el snapshot previo; se usa la primera aparición.")
+    # Posición en el previo de cada clave (la primera aparición gana)
+    prev_at = np.full(len(uniques), -1)
+    prev_at[prev_codes[::-1]] = np.arange(len(previous))[::-1]
+    in_current = np.zeros(len(uniques), dtype=bool)
+    in_current[cur_codes] = True
+    match = prev_at[cur_codes]
+    dropped = np.flatnonzero(~in_current[prev_codes])
+
+    matched = match >= 0
+    joined = current[['family_key'] + fields].reset_index(drop=True)
+    joined['_row'] = np.arange(len(current))
+    joined['_row_prev'] = match
+    for field in fields:
+        values = previous[field].reset_index(drop=True)
+        joined[field + '_prev'] = values.reindex(np.where(matched, match, -1)).to_numpy()
+    joined['_merge'] = np.where(matched, 'both', 'left_only')
+    right = previous[['family_key'] + fields].iloc[dropped].reset_index(drop=True)
+    right = right.rename(columns={f: f + '_prev' for f in fields})
+    right['_row'] = -1
+    right['_row_prev'] = dropped
+    right['_merge'] = 'right_only'
+    # Sin partes vacías ni columnas todo NA (p. ej. los _prev cuando ninguna familia
+    # coincide): los dtypes salen de los valores presentes, sin el FutureWarning de concat
+    parts = [part.dropna(axis=1, how='all') for part in (joined, right) if not part.empty]
+    if not parts:
+        return joined, fields
+    return pd.concat(parts, ignore_index=True).reindex(columns=joined.columns), fields
+
+def change_log(joined, fields):
+    """Tabla compacta (family_key, field, old, new) con los campos que cambiaron entre snapshots."""
+    both = joined[joined['_merge'] == 'both']
+    parts = []
+    for field in fields:
+        old, new = both[field + '_prev'], both[field]
+        changed = (old != new) & ~(old.isna() & new.isna())
+        parts.append(pd.DataFrame({
+            'family_key': both.loc[changed, 'family_key'],
+            'field': field,
+            'old': old[changed].astype(object),
+            'new': new[changed].astype(object),
+        }))
+    if not parts:
+        return pd.DataFrame(columns=['family_key', 'field', 'old', 'new'])
+    return pd.concat(parts, ignore_index=True)
+
+def build_delta(current, previous):
+    require_family_key(current, 'actual')
+    if previous.empty and 'family_key' not in previous.columns:
+        previous = pd.DataFrame(columns=current.columns)
+    require_family_key(previous, 'previo')
+    joined, fields = join_snapshots(current, previous)
+    status = joined['_merge']
+    both = status == 'both'
+    cat = joined['TRL_Category'] if 'TRL_Category' in fields else pd.Series(np.nan, index=joined.index)
+    cat_prev = joined['TRL_Category_prev'] if 'TRL_Category' in fields else cat
+    # Clasificación en una sola pasada sobre el join
+    # UPGRADED: B->A o C->A; DOWNGRADED: A->B/C o B->C
+    upgraded = both & (cat_prev != 'A') & (cat == 'A')
+    downgraded = both & (((cat_prev == 'A') & (cat != 'A')) | ((cat_prev == 'B') & (cat == 'C')))
+    # EXCLUDED_BY_RULE: VB_Eligible pasó de 1 a 0
+    if 'VB_Eligible' in fields:
+        excluded = both & (joined['VB_Eligible_prev'] == 1) & (joined['VB_Eligible'] == 0)
     else:
-        df_upgraded = pd.DataFrame()
-        df_downgraded = pd.DataFrame()
-        df_excluded = pd.DataFrame()
+        excluded = pd.Series(False, index=joined.index)
+
+    def current_rows(mask, field=None):
+        out = current.iloc[joined.loc[mask, '_row'].to_numpy()]
+        if field in fields:
+            # Valor previo tomado del snapshot para conservar su tipo
+            out = out.assign(**{field + '_prev': previous[field].to_numpy()[joined.loc[mask, '_row_prev'].to_numpy()]})
+        return out
+
+    return {
+        'NEW': current_rows(status == 'left_only'),
+        'DROPPED': previous.iloc[joined.loc[status == 'right_only', '_row_prev'].to_numpy()],
+        'UPGRADED': current_rows(upgraded, 'TRL_Category'),
+        'DOWNGRADED': current_rows(downgraded, 'TRL_Category'),
+        'EXCLUDED_BY_RULE': current_rows(excluded, 'VB_Eligible'),
+        'CHANGE_LOG': change_log(joined, fields),
+    }
+
+def write_delta(tabs, out_path):
     # Guardar en Excel con pestañas
     logging.info(f"Guardando reporte mensual en: {out_path}")
     with pd.ExcelWriter(out_path) as writer:
-        df_new.to_excel(writer, sheet_name='NEW', index=False)
-        df_dropped.to_excel(writer, sheet_name='DROPPED', index=False)
-        df_upgraded.to_excel(writer, sheet_name='UPGRADED', index=False)
-        df_downgraded.to_excel(writer, sheet_name='DOWNGRADED', index=False)
-        df_excluded.to_excel(writer, sheet_name='EXCLUDED_BY_RULE', index=False)
+        for sheet_name, tab_df in tabs.items():
+            tab_df.to_excel(writer, sheet_name=sheet_name, index=False)
     logging.info("Reporte mensual generado.")
 
+def delta_report(current_path, previous_path, out_path, period=None, history_root=None, back=1):
+    logging.info(f"Leyendo archivo actual: {current_path}")
+    current = load_data(current_path)
+    previous = load_previous(period, history_root, previous_path, back)
+    write_delta(build_delta(current, previous), out_path)
+
 def main():
     setup_logging()
     parser = argparse.ArgumentParser(description="Generate Monthly Update delta report.")
     parser.add_argument('--current', required=True, help='Current processed Excel file path')
     parser.add_argument('--previous-snapshot', required=False, help='Previous snapshot Excel file path')
     parser.add_argument('--delta-out', required=False, help='Output Excel file path for delta report')
+    parser.add_argument('--period', required=False, help='Current period (e.g. 2025_10); the previous one is taken from the history')
+    parser.add_argument('--history-dir', required=False, help='History dataset root (default from config or data/history/snapshots)')
+    parser.add_argument('--back', type=int, default=1, help='Compare against the period this many snapshots back')
     parser.add_argument('--config', required=False, help='Config YAML path')
     args = parser.parse_args()
     previous_snapshot = args.previous_snapshot
     delta_out = args.delta_out
+    history_root = args.history_dir
+    config = None
     if args.config:
         from utils import load_config
         config = load_config(args.config)
@@ -71,9 +176,12 @@ def main():
             previous_snapshot = config['paths']['previous_snapshot']
         if not delta_out and config and 'paths' in config and 'delta_out' in config['paths']:
             delta_out = config['paths']['delta_out']
-    if not previous_snapshot or not delta_out:
-        raise ValueError('Previous snapshot and delta output paths must be provided via CLI or config.yaml')
-    delta_report(args.current, previous_snapshot, delta_out)
+    if args.period and not history_root:
+        history_root = history.history_dir(config)
+    if not (previous_snapshot or args.period) or not delta_out:
+        raise ValueError('A previous snapshot (or --period for the history) and the delta output path '
+                         'must be provided via CLI or config.yaml')
+    delta_report(args.current, previous_snapshot, delta_out, args.period, history_root, args.back)
 
 if __name__ == "__main__":
     main()
@@ -2,6 +2,8 @@ import argparse
 import pandas as pd
 import logging
 from utils import load_config
+from storage import read_table
+import os
 
 
 def setup_logging():
@@ -33,9 +35,15 @@ def export_public(df, output_path):
     public_df.to_csv(output_path, index=False)
     logging.info("Vista pública exportada.")
 
+def internal_output_path(input_path):
+    """Excel path for the internal view, derived from the processed input path."""
+    base, ext = os.path.splitext(input_path)
+    # Columnar intermediates get their Excel export next to them; Excel inputs keep the old suffix
+    return base + ('_internal.xlsx' if ext == '.xlsx' else '.xlsx')
+
 def process(input_path, internal_path, public_path, config_path):
     logging.info(f"Leyendo archivo procesado: {input_path}")
-    df = pd.read_excel(input_path)
+    df = read_table(input_path)
     config = load_config(config_path)
     export_internal(df, internal_path)
     export_public(df, public_path)
@@ -43,14 +51,14 @@ def process(input_path, internal_path, public_path, config_path):
 def main():
     setup_logging()
     parser = argparse.ArgumentParser(description="Export internal and public views from processed data.")
-    parser.add_argument('--input', required=True, help='Input processed Excel file path')
+    parser.add_argument('--input', required=True, help='Input processed file path (.parquet, .feather or .xlsx)')
     parser.add_argument('--public', required=False, help='Output public CSV file path')
     parser.add_argument('--config', required=True, help='Config YAML path')
     args = parser.parse_args()
     from utils import load_config
     config = load_config(args.config)
     public_path = args.public or config['paths'].get('public_output')
-    internal_path = args.input.replace('.xlsx', '_internal.xlsx')
+    internal_path = internal_output_path(args.input)
     if not public_path:
         raise ValueError('Public output path must be provided via CLI or config.yaml')
     process(args.input, internal_path, public_path, args.config)
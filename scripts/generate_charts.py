@@ -1,9 +1,23 @@
 import argparse
+import hashlib
+import inspect
 import pandas as pd
 import logging
-import matplotlib.pyplot as plt
+import math
+import numpy as np
 import os
-from utils import load_config
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from utils import load_config, file_hash, prune_oldest
+from storage import read_table
+
+# Figures are drawn with the object-oriented Figure API (Agg canvas, no pyplot
+# state), so each chart can be rendered in its own worker process. matplotlib is
+# only imported when PNGs are rendered: with charts.engine 'native' the dashboard
+# uses xlsxwriter charts bound to the sheet data instead.
+
+RADAR_METRICS = ['Patent Valuation Score Technology', 'Patent Valuation Score Legal', 'Patent Valuation Score Citation']
 
 def setup_logging():
     logging.basicConfig(
@@ -12,17 +26,34 @@ def setup_logging():
         handlers=[logging.StreamHandler()]
     )
 
-def radar_chart(df, outdir):
-    logging.info("Generando Radar_TRL_Fit_ABC.png...")
-    categories = ['A', 'B', 'C']
-    metrics = ['Patent Valuation Score Technology', 'Patent Valuation Score Legal', 'Patent Valuation Score Citation']
+def radar_values(df):
+    """Mean of each radar metric per TRL category (0 when a category has no values)."""
+    return pd.DataFrame(
+        [[df[df['TRL_Category'] == cat][m].mean() if not df[df['TRL_Category'] == cat][m].isnull().all() else 0
+          for m in RADAR_METRICS] for cat in ['A', 'B', 'C']],
+        index=['A', 'B', 'C'], columns=RADAR_METRICS)
+
+def top10_data(df):
+    return df.nlargest(10, 'TRL_Fit_Index')[['family_key', 'TRL_Fit_Index']]
+
+def trend_data(df):
+    """Families per publication month."""
+    dates = pd.to_datetime(df['Publication Date'], errors='coerce')
+    trend = df.groupby(dates.dt.to_period('M')).size()
+    trend.index = trend.index.astype(str)
+    return trend
+
+def radar_chart(df, path, title='Radar TRL-Fit ABC'):
+    from matplotlib.figure import Figure
+    logging.info(f"Generando {path}...")
+    metrics = RADAR_METRICS
     num_vars = len(metrics)
     angles = [n / float(num_vars) * 2 * 3.141592653589793 for n in range(num_vars)]
     angles += angles[:1]
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
-    for cat in categories:
-        # Get means for each metric, handle missing data
-        values = [df[df['TRL_Category'] == cat][m].mean() if not df[df['TRL_Category'] == cat][m].isnull().all() else 0 for m in metrics]
+    fig = Figure(figsize=(6, 6))
+    ax = fig.add_subplot(polar=True)
+    for cat, row in radar_values(df).iterrows():
+        values = row.tolist()
         values += values[:1]  # close the polygon
         ax.plot(angles, values, label=cat)
         ax.fill(angles, values, alpha=0.1)
@@ -31,48 +62,249 @@ def radar_chart(df, outdir):
     ax.set_yticks([20, 40, 60, 80, 100])
     ax.set_ylim(0, 100)
     ax.grid(True)
-    plt.title('Radar TRL-Fit ABC')
+    ax.set_title(title)
     ax.legend(loc='upper right', bbox_to_anchor=(1.1, 1.1))
-    plt.tight_layout()
-    plt.savefig(os.path.join(outdir, 'Radar_TRL_Fit_ABC.png'))
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(path)
     logging.info("Radar chart guardado.")
 
-def top10_chart(df, outdir):
-    logging.info("Generando Top10_TRL_Fit_Index.png...")
-    top10 = df.nlargest(10, 'TRL_Fit_Index')
-    plt.figure(figsize=(10, 6))
-    plt.barh(top10['family_key'], top10['TRL_Fit_Index'])
-    plt.xlabel('TRL Fit Index')
-    plt.title('Top 10 TRL Fit Index')
-    plt.tight_layout()
-    plt.savefig(os.path.join(outdir, 'Top10_TRL_Fit_Index.png'))
-    plt.close()
+def top10_chart(df, path, title='Top 10 TRL Fit Index'):
+    from matplotlib.figure import Figure
+    logging.info(f"Generando {path}...")
+    top10 = top10_data(df)
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.barh(top10['family_key'], top10['TRL_Fit_Index'])
+    ax.set_xlabel('TRL Fit Index')
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path)
     logging.info("Top10 chart guardado.")
 
-def trend_chart(df, outdir):
-    logging.info("Generando Trend_Patents.png...")
-    df['Publication Date'] = pd.to_datetime(df['Publication Date'], errors='coerce')
-    trend = df.groupby(df['Publication Date'].dt.to_period('M')).size()
-    trend.index = trend.index.astype(str)
-    plt.figure(figsize=(10, 6))
-    plt.plot(trend.index, trend.values, marker='o')
-    plt.xlabel('Mes de publicación')
-    plt.ylabel('Número de familias')
-    plt.title('Trend Patents')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(outdir, 'Trend_Patents.png'))
-    plt.close()
+def trend_chart(df, path, title='Trend Patents'):
+    from matplotlib.figure import Figure
+    logging.info(f"Generando {path}...")
+    trend = trend_data(df)
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.plot(trend.index, trend.values, marker='o')
+    ax.set_xlabel('Mes de publicación')
+    ax.set_ylabel('Número de familias')
+    ax.set_title(title)
+    ax.tick_params(axis='x', labelrotation=45)
+    fig.tight_layout()
+    fig.savefig(path)
     logging.info("Trend chart guardado.")
 
-def process(input_path, period, outdir, config_path):
+# Chart function, file name, title and the columns it reads (only these are sent to the workers)
+CHARTS = [
+    (radar_chart, 'Radar_TRL_Fit_ABC.png', 'Radar TRL-Fit ABC', ['TRL_Category'] + RADAR_METRICS),
+    (top10_chart, 'Top10_TRL_Fit_Index.png', 'Top 10 TRL Fit Index', ['family_key', 'TRL_Fit_Index']),
+    (trend_chart, 'Trend_Patents.png', 'Trend Patents', ['Publication Date']),
+]
+CHART_ENGINES = ('matplotlib', 'native')
+# Besides the global figures, one set per value of these columns (outdir/<folder>/<value>/)
+SLICE_COLUMNS = {'Primary_Mission': 'by_mission', 'Primary_Domain': 'by_domain'}
+
+# Figures kept in the figure cache (most recently used first); config cache.figure_keep
+FIGURE_CACHE_KEEP = 500
+
+def _slice_dir(value):
+    # Sanitizing can map distinct values to the same name, so a hash of the raw value is appended
+    name = re.sub(r'[^\w.-]+', '_', str(value)).strip('_') or 'NA'
+    return f"{name}_{hashlib.sha1(str(value).encode()).hexdigest()[:8]}"
+
+def figure_key(chart, data, title):
+    """Content hash of a figure: module code, title, matplotlib version and the exact data slice."""
+    import matplotlib
+    h = hashlib.sha256()
+    # The whole module, so edits to the data helpers (radar_values, top10_data...) count too
+    h.update(file_hash(inspect.getsourcefile(chart)).encode())
+    h.update(f"{title}|{matplotlib.__version__}|{list(data.columns)}|{list(data.dtypes.astype(str))}".encode())
+    h.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def chart_jobs(df, outdir):
+    """(chart, data, path, title) for the global figures and every mission/domain slice."""
+    scopes = [(df, outdir, '')]
+    for column, folder in SLICE_COLUMNS.items():
+        if column not in df.columns:
+            continue
+        for value, part in df.groupby(column, sort=True):
+            scopes.append((part, os.path.join(outdir, folder, _slice_dir(value)), f" - {value}"))
+    jobs = []
+    for data, scope_dir, suffix in scopes:
+        for chart, filename, title, columns in CHARTS:
+            cols = [c for c in columns if c in data.columns]
+            jobs.append((chart, data[cols].reset_index(drop=True), os.path.join(scope_dir, filename), title + suffix))
+    return jobs
+
+def render_charts(df, outdir, workers=None, cache_dir=None, cache_keep=FIGURE_CACHE_KEEP):
+    """Render every chart job, concurrently when workers > 1; returns once all are saved.
+
+    With cache_dir, figures are stored by figure_key and unchanged ones are copied from
+    the cache instead of being drawn again; only the cache_keep most recently used
+    figures are kept. Returns the number of cache hits and misses.
+    """
+    pending = []
+    hits = 0
+    for chart, data, path, title in chart_jobs(df, outdir):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cached = os.path.join(cache_dir, figure_key(chart, data, title) + '.png') if cache_dir else None
+        if cached and os.path.exists(cached):
+            shutil.copyfile(cached, path)
+            # Mark as recently used, so pruning keeps it
+            os.utime(cached)
+            hits += 1
+        else:
+            pending.append((chart, data, path, title, cached))
+    if cache_dir:
+        logging.info(f"Caché de gráficos: {hits} reutilizados, {len(pending)} por generar")
+
+    workers = min(workers or os.cpu_count() or 1, max(len(pending), 1))
+    if workers <= 1:
+        for chart, data, path, title, _ in pending:
+            chart(data, path, title)
+    else:
+        logging.info(f"Generando {len(pending)} gráficos en {workers} procesos...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(chart, data, path, title) for chart, data, path, title, _ in pending]
+            for future in futures:
+                # Re-raises a worker error here, before the dashboard is assembled
+                future.result()
+    for _, _, path, _, cached in pending:
+        if cached:
+            os.makedirs(cache_dir, exist_ok=True)
+            shutil.copyfile(path, cached)
+    if cache_dir and os.path.isdir(cache_dir):
+        pruned = prune_oldest([os.path.join(cache_dir, name) for name in os.listdir(cache_dir)
+                               if name.endswith('.png')], cache_keep)
+        if pruned:
+            logging.info(f"Caché de gráficos: {len(pruned)} figuras antiguas eliminadas")
+    return {'hits': hits, 'misses': len(pending)}
+
+def sanitize_frame(df):
+    """Cell values ready for xlsxwriter, converted column by column.
+
+    Lists/tuples/sets become their str(), NaN/None/NaT and +/-inf become ''.
+    Returns a list of rows.
+    """
+    out = {}
+    for col_idx, col in enumerate(df.columns):
+        s = df.iloc[:, col_idx]
+        if s.dtype == object:
+            is_seq = s.map(lambda v: isinstance(v, (list, tuple, set)))
+            if is_seq.any():
+                s = s.where(~is_seq, s[is_seq].map(str))
+        missing = s.isna()
+        if pd.api.types.is_float_dtype(s.dtype):
+            missing |= np.isinf(s)
+        elif s.dtype == object:
+            missing |= s.map(lambda v: isinstance(v, float) and math.isinf(v))
+        out[col_idx] = s.astype(object).where(~missing, '')
+    if not out:
+        return []
+    return pd.DataFrame(out).to_numpy(dtype=object).tolist()
+
+def write_frame(sheet, df, first_row=0, first_col=0):
+    """Header plus rows of df with one write_row call per row."""
+    sheet.write_row(first_row, first_col, [str(c) for c in df.columns])
+    for row_idx, row in enumerate(sanitize_frame(df)):
+        sheet.write_row(first_row + 1 + row_idx, first_col, row)
+
+def write_side_by_side(sheet, frames, spacing):
+    """Several tables side by side (title row, header row, data), written row by row.
+
+    constant_memory only accepts increasing rows, so each sheet row is completed across
+    all tables before moving to the next one.
+    """
+    blocks = []
+    for idx, (title, frame) in enumerate(frames.items()):
+        blocks.append((idx * spacing, [[title], [str(c) for c in frame.columns]] + sanitize_frame(frame)))
+    for row_idx in range(max((len(rows) for _, rows in blocks), default=0)):
+        for first_col, rows in blocks:
+            if row_idx < len(rows):
+                sheet.write_row(row_idx, first_col, rows[row_idx])
+
+def native_radar(workbook, sheet, sheet_name, values):
+    """Radar values table (metrics x A/B/C) and an xlsxwriter radar chart over it."""
+    write_frame(sheet, values.T.rename_axis('Metric').reset_index())
+    chart = workbook.add_chart({'type': 'radar', 'subtype': 'filled'})
+    for col_idx, cat in enumerate(values.index, start=1):
+        chart.add_series({
+            'name': [sheet_name, 0, col_idx],
+            'categories': [sheet_name, 1, 0, len(values.columns), 0],
+            'values': [sheet_name, 1, col_idx, len(values.columns), col_idx],
+            'fill': {'transparency': 90},
+        })
+    chart.set_title({'name': 'Radar TRL-Fit ABC'})
+    chart.set_y_axis({'min': 0, 'max': 100, 'major_unit': 20})
+    sheet.insert_chart('F2', chart, {'x_scale': 1.2, 'y_scale': 1.5})
+
+def native_series_chart(workbook, sheet, sheet_name, data, chart_type, title, x_title=None, y_title=None):
+    """Two-column table (label, value) and a chart of the given type bound to it."""
+    write_frame(sheet, data)
+    chart = workbook.add_chart(chart_type)
+    chart.add_series({
+        'name': [sheet_name, 0, 1],
+        'categories': [sheet_name, 1, 0, len(data), 0],
+        'values': [sheet_name, 1, 1, len(data), 1],
+        'marker': {'type': 'circle'} if chart_type['type'] == 'line' else {'type': 'none'},
+    })
+    chart.set_title({'name': title})
+    chart.set_legend({'none': True})
+    if x_title:
+        chart.set_x_axis({'name': x_title})
+    if y_title:
+        chart.set_y_axis({'name': y_title})
+    sheet.insert_chart('D2', chart, {'x_scale': 1.5, 'y_scale': 1.5})
+
+def native_heatmap(workbook, sheet, sheet_name, heatmap):
+    """Colour scale over the mission x month table plus a stacked column chart per mission."""
+    n_rows, n_cols = heatmap.shape
+    sheet.conditional_format(1, 1, n_rows, n_cols, {'type': '3_color_scale'})
+    chart = workbook.add_chart({'type': 'column', 'subtype': 'stacked'})
+    for row_idx in range(1, n_rows + 1):
+        chart.add_series({
+            'name': [sheet_name, row_idx, 0],
+            'categories': [sheet_name, 0, 1, 0, n_cols],
+            'values': [sheet_name, row_idx, 1, row_idx, n_cols],
+        })
+    chart.set_title({'name': 'Familias por misión y mes'})
+    sheet.insert_chart(n_rows + 2, 1, chart, {'x_scale': 1.5, 'y_scale': 1.5})
+
+def dashboard_inputs(input_path, period, public_path=None, delta_path=None, manifest_path=None):
+    """Public CSV, monthly update and manifest read by the dashboard; defaults follow the pipeline layout."""
+    processed_dir = os.path.dirname(input_path)
+    return {
+        'public_path': public_path or os.path.join(processed_dir, f'TRL2-4_Fit_Index_{period}_public.csv'),
+        'delta_path': delta_path or os.path.join(processed_dir, f'monthly_update_{period}.xlsx'),
+        'manifest_path': manifest_path or os.path.join('logs', f'run_manifest_{period}.json'),
+    }
+
+def process(input_path, period, outdir, config_path, workers=None, engine=None, public_path=None, delta_path=None,
+            manifest_path=None):
     logging.info(f"Leyendo archivo procesado: {input_path}")
-    df = pd.read_excel(input_path)
-    os.makedirs(outdir, exist_ok=True)
-    radar_chart(df, outdir)
-    top10_chart(df, outdir)
-    trend_chart(df, outdir)
+    df = read_table(input_path)
+    render(df, period, outdir, load_config(config_path), workers, engine,
+           **dashboard_inputs(input_path, period, public_path, delta_path, manifest_path))
+
+def render(df, period, outdir, config, workers=None, engine=None, public_path=None, delta_path=None,
+           manifest_path=None):
+    """Figures and the Excel dashboard; the Public_View, Delta and Coverage_KPI sheets read the given files."""
+    charts_config = config.get('charts') or {}
+    engine = engine or charts_config.get('engine', 'matplotlib')
+    if engine not in CHART_ENGINES:
+        raise ValueError(f"Unsupported chart engine: {engine}")
+    native = engine == 'native'
+    if native:
+        logging.info("Gráficos nativos de Excel: no se generan PNG.")
+    else:
+        os.makedirs(outdir, exist_ok=True)
+        if workers is None:
+            workers = charts_config.get('workers')
+        render_charts(df, outdir, workers, config.get('paths', {}).get('figure_cache'),
+                      (config.get('cache') or {}).get('figure_keep', FIGURE_CACHE_KEEP))
 
     # Create Excel dashboard
     try:
@@ -80,11 +312,13 @@ def process(input_path, period, outdir, config_path):
     except ImportError:
         logging.error("xlsxwriter not installed. Run 'pip install xlsxwriter'.")
         return
-    
-    config = load_config(config_path)
+
     dashboard_root = config['paths'].get('dashboard_path') or config['paths'].get('dasboard_path') or 'dashboard/'
+    os.makedirs(dashboard_root, exist_ok=True)
     dashboard_path = os.path.join(dashboard_root, f'Radar_Tecnologico_{period}.xlsx')
-    workbook = xlsxwriter.Workbook(dashboard_path)
+    # constant_memory flushes each row as soon as the next one starts, so every
+    # sheet below is written strictly top to bottom
+    workbook = xlsxwriter.Workbook(dashboard_path, {'constant_memory': True})
 
     # Overview sheet
     overview = workbook.add_worksheet('Overview')
@@ -96,43 +330,43 @@ def process(input_path, period, outdir, config_path):
 
     # Radar chart sheet
     radar_sheet = workbook.add_worksheet('Radar_TRL_Fit')
-    radar_img = os.path.join(outdir, 'Radar_TRL_Fit_ABC.png')
-    radar_sheet.insert_image('B2', radar_img)
+    if native:
+        native_radar(workbook, radar_sheet, 'Radar_TRL_Fit', radar_values(df))
+    else:
+        radar_img = os.path.join(outdir, 'Radar_TRL_Fit_ABC.png')
+        radar_sheet.insert_image('B2', radar_img)
 
     # Top10 chart sheet
     top10_sheet = workbook.add_worksheet('Top10_TRL_Fit_Index')
-    top10_img = os.path.join(outdir, 'Top10_TRL_Fit_Index.png')
-    top10_sheet.insert_image('B2', top10_img)
+    if native:
+        native_series_chart(workbook, top10_sheet, 'Top10_TRL_Fit_Index', top10_data(df), {'type': 'bar'},
+                            'Top 10 TRL Fit Index', x_title='TRL Fit Index')
+    else:
+        top10_img = os.path.join(outdir, 'Top10_TRL_Fit_Index.png')
+        top10_sheet.insert_image('B2', top10_img)
 
     # Trend chart sheet
     trend_sheet = workbook.add_worksheet('Trend_Patents')
-    trend_img = os.path.join(outdir, 'Trend_Patents.png')
-    trend_sheet.insert_image('B2', trend_img)
+    if native:
+        trend = trend_data(df)
+        native_series_chart(workbook, trend_sheet, 'Trend_Patents',
+                            pd.DataFrame({'Month': trend.index, 'Families': trend.values}), {'type': 'line'},
+                            'Trend Patents', x_title='Mes de publicación', y_title='Número de familias')
+    else:
+        trend_img = os.path.join(outdir, 'Trend_Patents.png')
+        trend_sheet.insert_image('B2', trend_img)
 
     # Data sheet (public view)
-    public_csv = os.path.join(os.path.dirname(input_path), f'TRL2-4_Fit_Index_{period}_public.csv')
-    if os.path.exists(public_csv):
-        public_df = pd.read_csv(public_csv)
+    if public_path and os.path.exists(public_path):
+        public_df = pd.read_csv(public_path)
         data_sheet = workbook.add_worksheet('Public_View')
-        for col_idx, col in enumerate(public_df.columns):
-            data_sheet.write(0, col_idx, col)
-        for row_idx, row in enumerate(public_df.values):
-            for col_idx, val in enumerate(row):
-                data_sheet.write(row_idx + 1, col_idx, val)
+        write_frame(data_sheet, public_df)
 
     # Spin-off Candidates (A)
     spin_off_sheet = workbook.add_worksheet('Spin-off_Candidates_A')
     spin_off = df[(df['TRL_Category'] == 'A') & (df.get('VB_Eligible', 1) == 1)]
     if not spin_off.empty:
-        for col_idx, col in enumerate(spin_off.columns):
-            spin_off_sheet.write(0, col_idx, col)
-        for row_idx, row in enumerate(spin_off.values):
-            for col_idx, val in enumerate(row):
-                # Fix: convert NaN/Inf to empty string for Excel
-                if pd.isna(val) or (isinstance(val, float) and (pd.isnull(val) or pd.isna(val) or val == float('inf') or val == float('-inf'))):
-                    spin_off_sheet.write(row_idx + 1, col_idx, '')
-                else:
-                    spin_off_sheet.write(row_idx + 1, col_idx, val)
+        write_frame(spin_off_sheet, spin_off)
     else:
         spin_off_sheet.write(0, 0, 'No spin-off candidates found.')
 
@@ -141,25 +375,18 @@ def process(input_path, period, outdir, config_path):
     if 'Primary_Mission' in df.columns and 'Publication Date' in df.columns:
         df['Pub_Month'] = pd.to_datetime(df['Publication Date'], errors='coerce').dt.to_period('M').astype(str)
         heatmap = df.groupby(['Primary_Mission', 'Pub_Month']).size().unstack(fill_value=0)
-        heatmap_sheet.write(0, 0, 'Primary_Mission')
-        for col_idx, col in enumerate(heatmap.columns):
-            heatmap_sheet.write(0, col_idx + 1, col)
-        for row_idx, (mission, row) in enumerate(heatmap.iterrows()):
-            heatmap_sheet.write(row_idx + 1, 0, mission)
-            for col_idx, val in enumerate(row):
-                heatmap_sheet.write(row_idx + 1, col_idx + 1, val)
+        write_frame(heatmap_sheet, heatmap.rename_axis(index='Primary_Mission', columns=None).reset_index())
+        if native and not heatmap.empty:
+            native_heatmap(workbook, heatmap_sheet, 'Heatmap_Mission_Month', heatmap)
     else:
         heatmap_sheet.write(0, 0, 'Insufficient data for heatmap.')
 
     # Pareto Titular
     pareto_sheet = workbook.add_worksheet('Pareto_Titular')
     if 'Assignee Details Name' in df.columns:
-        pareto = df['Assignee Details Name'].value_counts().head(20)
-        pareto_sheet.write(0, 0, 'Assignee')
-        pareto_sheet.write(0, 1, 'Families_Count')
-        for idx, (assignee, count) in enumerate(pareto.items()):
-            pareto_sheet.write(idx + 1, 0, assignee)
-            pareto_sheet.write(idx + 1, 1, count)
+        # In-process runs keep assignees as lists; count each holder separately
+        pareto = df['Assignee Details Name'].explode().value_counts().head(20)
+        write_frame(pareto_sheet, pd.DataFrame({'Assignee': pareto.index, 'Families_Count': pareto.values}))
     else:
         pareto_sheet.write(0, 0, 'Assignee column not found.')
 
@@ -168,47 +395,38 @@ def process(input_path, period, outdir, config_path):
     if 'Publication Date' in df.columns:
         df['Pub_Year'] = pd.to_datetime(df['Publication Date'], errors='coerce').dt.year
         cohorts = df.groupby('Pub_Year').size()
-        cohorts_sheet.write(0, 0, 'Year')
-        cohorts_sheet.write(0, 1, 'Families_Count')
-        for idx, (year, count) in enumerate(cohorts.items()):
-            cohorts_sheet.write(idx + 1, 0, year)
-            cohorts_sheet.write(idx + 1, 1, count)
+        write_frame(cohorts_sheet, pd.DataFrame({'Year': cohorts.index, 'Families_Count': cohorts.values}))
     else:
         cohorts_sheet.write(0, 0, 'Publication Date column not found.')
 
     # Delta (Monthly Update)
     delta_sheet = workbook.add_worksheet('Delta')
-    monthly_update_path = os.path.join(os.path.dirname(input_path), f'monthly_update_{period}.xlsx')
     try:
-        monthly_update = pd.read_excel(monthly_update_path, sheet_name=None)
-        for sheet_idx, (tab, tab_df) in enumerate(monthly_update.items()):
-            delta_sheet.write(0, sheet_idx * 10, tab)
-            for col_idx, col in enumerate(tab_df.columns):
-                delta_sheet.write(1, sheet_idx * 10 + col_idx, col)
-            for row_idx, row in enumerate(tab_df.values):
-                for col_idx, val in enumerate(row):
-                    delta_sheet.write(row_idx + 2, sheet_idx * 10 + col_idx, val)
+        monthly_update = pd.read_excel(delta_path, sheet_name=None)
     except Exception:
+        monthly_update = None
+    if monthly_update is not None:
+        write_side_by_side(delta_sheet, monthly_update, spacing=10)
+    else:
         delta_sheet.write(0, 0, 'Monthly update file not found or unreadable.')
 
     # Coverage KPI
     kpi_sheet = workbook.add_worksheet('Coverage_KPI')
-    manifest_path = os.path.join(os.path.dirname(input_path), f'../logs/run_manifest_{period}.json')
     try:
         import json
         with open(manifest_path, 'r') as f:
             manifest = json.load(f)
-        kpi_sheet.write(0, 0, 'KPI')
-        kpi_sheet.write(0, 1, 'Value')
-        kpi_sheet.write(1, 0, '%M0 (Unmapped)')
-        kpi_sheet.write(1, 1, manifest['mapping']['unmapped_pct'])
-        kpi_sheet.write(2, 0, 'Total Families')
-        kpi_sheet.write(2, 1, manifest['counts']['total'])
-        # Top-5 unmapped CPC (placeholder)
-        kpi_sheet.write(3, 0, 'Top-5 Unmapped CPC')
-        kpi_sheet.write(3, 1, 'See mapping QA report')
+        kpis = [
+            ['KPI', 'Value'],
+            ['%M0 (Unmapped)', manifest['mapping']['unmapped_pct']],
+            ['Total Families', manifest['counts']['total']],
+            # Top-5 unmapped CPC (placeholder)
+            ['Top-5 Unmapped CPC', 'See mapping QA report'],
+        ]
     except Exception:
-        kpi_sheet.write(0, 0, 'Manifest file not found or unreadable.')
+        kpis = [['Manifest file not found or unreadable.']]
+    for row_idx, row in enumerate(kpis):
+        kpi_sheet.write_row(row_idx, 0, row)
 
     workbook.close()
     logging.info(f"Excel dashboard generado en: {dashboard_path}")
@@ -219,14 +437,23 @@ def main():
     parser.add_argument('--input', required=True, help='Input processed Excel file path')
     parser.add_argument('--period', required=True, help='Period (YYYY_MM)')
     parser.add_argument('--outdir', required=False, help='Output directory for figures')
+    parser.add_argument('--public', required=False, help='Public CSV path (default: next to the input)')
+    parser.add_argument('--delta', required=False, help='Monthly update Excel path (default: next to the input)')
+    parser.add_argument('--manifest', required=False, help='Run manifest JSON path (default: logs/run_manifest_<period>.json)')
     parser.add_argument('--config', required=True, help='Config YAML path')
+    parser.add_argument('--workers', type=int, required=False,
+                        help='Processes used to render the figures (default: config charts.workers or CPU count)')
+    parser.add_argument('--engine', choices=['matplotlib', 'native'], required=False,
+                        help='matplotlib: PNG figures embedded in the dashboard; native: Excel charts, no matplotlib '
+                             '(default: config charts.engine or matplotlib)')
     args = parser.parse_args()
     from utils import load_config
     config = load_config(args.config)
     outdir = args.outdir or config['paths'].get('figures_dir')
-    if not outdir:
+    if not outdir and args.engine != 'native':
         raise ValueError('Output directory for figures must be provided via CLI or config.yaml')
-    process(args.input, args.period, outdir, args.config)
+    process(args.input, args.period, outdir, args.config, args.workers, args.engine, args.public, args.delta,
+            args.manifest)
 
 if __name__ == "__main__":
     main()
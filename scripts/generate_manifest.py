@@ -3,9 +3,13 @@ import pandas as pd
 import yaml
 import json
 import logging
-import hashlib
 import os
 from datetime import datetime
+from storage import read_table
+from utils import file_hash
+
+# Only these columns feed the counts and mapping KPIs
+MANIFEST_COLUMNS = ['TRL_Category', 'VB_Eligible', 'Primary_Mission']
 
 def setup_logging():
     logging.basicConfig(
@@ -14,21 +18,15 @@ def setup_logging():
         handlers=[logging.StreamHandler()]
     )
 
-def file_hash(path):
-    h = hashlib.sha256()
-    with open(path, 'rb') as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+def load_cpc_cache_stats(config):
+    # Hit/miss counts of the last map_to_missions run, stored alongside the cache
+    cache_path = config.get('paths', {}).get('cpc_cache')
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'r') as f:
+        return json.load(f).get('last_run')
 
-def manifest(input_path, config_path, output_path, period, pipeline_version):
-    logging.info(f"Generando manifiesto de ejecución en: {output_path}")
-    df = pd.read_excel(input_path)
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+def build_manifest(df, input_path, config, period, pipeline_version, cpc_cache_stats=None):
     # Only include config variables that were actually used
     used_config = {}
     # weights and thresholds always used
@@ -43,7 +41,7 @@ def manifest(input_path, config_path, output_path, period, pipeline_version):
     if 'paths' in config:
         used_paths = {}
         for k, v in config['paths'].items():
-            if k in ['whitelist', 'blacklist', 'cpc_map', 'dashboard_path', 'dasboard_path', 'figures_dir', 'public_output', 'cleaned_output', 'fit_index_output', 'flags_output', 'missions_output', 'sensitivity_output', 'previous_snapshot', 'delta_out']:
+            if k in ['whitelist', 'blacklist', 'cpc_map', 'cpc_cache', 'figure_cache', 'stage_cache', 'dashboard_path', 'dasboard_path', 'figures_dir', 'public_output', 'cleaned_output', 'fit_index_output', 'flags_output', 'missions_output', 'sensitivity_output', 'previous_snapshot', 'history_dir', 'mission_counts_dir', 'delta_out']:
                 used_paths[k] = v
         if used_paths:
             used_config['paths'] = used_paths
@@ -67,6 +65,7 @@ def manifest(input_path, config_path, output_path, period, pipeline_version):
         'mapping': {
             'mapped_pct': 1 - (df['Primary_Mission'].eq('M0').mean() if 'Primary_Mission' in df.columns else 1),
             'unmapped_pct': df['Primary_Mission'].eq('M0').mean() if 'Primary_Mission' in df.columns else 1,
+            'cpc_cache': cpc_cache_stats,
         },
         'timing': {
             'start': None,
@@ -74,10 +73,29 @@ def manifest(input_path, config_path, output_path, period, pipeline_version):
             'duration_sec': None
         }
     }
+    return manifest
+
+def write_manifest(manifest, output_path):
     with open(output_path, 'w') as f:
         json.dump(manifest, f, indent=2, ensure_ascii=False)
     logging.info("Manifiesto guardado.")
 
+def add_timing(output_path, timing):
+    """Fill the timing block of a written manifest once every stage has finished."""
+    with open(output_path, 'r') as f:
+        manifest = json.load(f)
+    manifest['timing'] = timing
+    write_manifest(manifest, output_path)
+
+def manifest(input_path, config_path, output_path, period, pipeline_version):
+    logging.info(f"Generando manifiesto de ejecución en: {output_path}")
+    df = read_table(input_path, columns=MANIFEST_COLUMNS)
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    run_manifest = build_manifest(df, input_path, config, period, pipeline_version,
+                                  cpc_cache_stats=load_cpc_cache_stats(config))
+    write_manifest(run_manifest, output_path)
+
 def main():
     setup_logging()
     parser = argparse.ArgumentParser(description="Generate pipeline run manifest.")
@@ -0,0 +1,95 @@
+import argparse
+import logging
+import os
+import pandas as pd
+from storage import partition_values, read_partitions, read_table, write_partition
+
+# Histórico de snapshots mensuales.
+# Cada ejecución añade su tabla interna como partición Parquet
+# data/history/snapshots/period=<YYYY_MM>/, de modo que cualquier periodo (o un
+# subconjunto de familias) se lee con un escaneo filtrado en vez de abrir Excel antiguos.
+
+HISTORY_DIR = 'data/history/snapshots'
+# Agregados por periodo (familias por misión y categoría) para las consultas de tendencias
+MISSION_COUNTS_DIR = 'data/history/mission_counts'
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+def history_dir(config):
+    return ((config or {}).get('paths') or {}).get('history_dir', HISTORY_DIR)
+
+def mission_counts_dir(config):
+    return ((config or {}).get('paths') or {}).get('mission_counts_dir', MISSION_COUNTS_DIR)
+
+def list_periods(root):
+    """Periodos guardados en el histórico, en orden cronológico (YYYY_MM)."""
+    return partition_values(root, 'period')
+
+def previous_period(root, period, back=1):
+    """Periodo guardado `back` posiciones antes de `period`, o None si no existe."""
+    earlier = [p for p in list_periods(root) if p < period]
+    return earlier[-back] if len(earlier) >= back else None
+
+def mission_counts(df):
+    """Familias por Primary_Mission y TRL_Category de un snapshot."""
+    keys = [c for c in ['Primary_Mission', 'TRL_Category'] if c in df.columns]
+    if not keys:
+        return pd.DataFrame({'count': [len(df)]})
+    return df[keys].astype(object).groupby(keys, dropna=False).size().reset_index(name='count')
+
+def append_snapshot(df, root, period, counts_root=None):
+    """Guarda el snapshot del periodo (y sus agregados si se indica counts_root).
+
+    Volver a ejecutar un periodo reemplaza sus particiones.
+    """
+    logging.info(f"Guardando snapshot {period} en el histórico: {root}")
+    write_partition(df, root, 'period', period)
+    if counts_root:
+        write_partition(mission_counts(df), counts_root, 'period', period)
+
+def stale_counts(root, counts_root):
+    """Periodos sin agregado, o con un snapshot más reciente que su agregado."""
+    stale = []
+    for period in list_periods(root):
+        counts_path = os.path.join(counts_root, f"period={period}")
+        if (not os.path.isdir(counts_path)
+                or os.path.getmtime(counts_path) < os.path.getmtime(os.path.join(root, f"period={period}"))):
+            stale.append(period)
+    return stale
+
+def update_counts(root, counts_root):
+    """Calcula solo los agregados que faltan o están desfasados."""
+    for period in stale_counts(root, counts_root):
+        logging.info(f"Actualizando agregados del periodo {period}")
+        df = read_snapshot(root, period, columns=['Primary_Mission', 'TRL_Category'])
+        write_partition(mission_counts(df), counts_root, 'period', period)
+
+def read_snapshot(root, period, columns=None, family_keys=None):
+    """Snapshot de un periodo, opcionalmente solo algunas columnas y familias."""
+    import pyarrow.dataset as ds
+    key_filter = ds.field('family_key').isin(list(family_keys)) if family_keys is not None else None
+    df = read_partitions(root, 'period', [period], columns=columns, filter=key_filter)
+    return df.drop(columns=['period'], errors='ignore')
+
+def read_history(root, periods=None, columns=None):
+    """Varios periodos en una sola tabla con columna 'period' (todos si periods es None)."""
+    return read_partitions(root, 'period', periods, columns=columns)
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Append a processed snapshot to the period-partitioned history.")
+    parser.add_argument('--input', required=True, help='Processed internal table (Parquet/Feather/Excel)')
+    parser.add_argument('--period', required=True, help='Period string, e.g. 2025_10')
+    parser.add_argument('--history-dir', default=HISTORY_DIR, help='History dataset root')
+    parser.add_argument('--counts-dir', default=MISSION_COUNTS_DIR, help='Per-period mission count aggregates root')
+    args = parser.parse_args()
+    logging.info(f"Leyendo archivo procesado: {args.input}")
+    append_snapshot(read_table(args.input), args.history_dir, args.period, args.counts_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import logging
+import numpy as np
+import pandas as pd
+from parse_patents import REQUIRED_COLUMNS, family_keys
+from utils import extract_first_dates, file_hash
+
+# Procesado incremental.
+# Cada familia lleva una huella (Input_Fingerprint) de sus filas del export bruto y de
+# las tablas auxiliares (whitelist, blacklist, cpc_to_mission). Las familias cuya huella
+# coincide con la del snapshot previo se copian de él; solo las nuevas o cambiadas pasan
+# por parse/flags/map. Lo que depende del conjunto completo (normalizaciones de
+# compute_fit_index, categorías y elegibilidad) se recalcula sobre el resultado unido.
+
+FINGERPRINT_COLUMN = 'Input_Fingerprint'
+FINGERPRINT_FIELDS = REQUIRED_COLUMNS + [
+    'Patent Number2', 'Country Code', 'CPC/IPC Codes', 'Dead or Alive', 'Litigation Exists'
+]
+
+def context_hash(paths):
+    """Hash de las tablas auxiliares: si cambian, todas las familias se recalculan."""
+    parts = []
+    for path in paths:
+        try:
+            parts.append(file_hash(path))
+        except (OSError, TypeError):
+            parts.append('')
+    return '|'.join(parts)
+
+def raw_family_keys(raw):
+    """family_key de cada fila del export bruto, como la calcula parse_patents."""
+    if 'Patent Number2' in raw.columns:
+        return family_keys(raw)
+    dates = extract_first_dates(raw['Publication Date'])
+    return family_keys(pd.DataFrame({'Title': raw['Title'], 'Publication Date': dates}))
+
+def family_fingerprints(raw, keys, context=''):
+    """Huella por family_key de sus filas brutas (campos de entrada, orden incluido) y del contexto."""
+    fields = [c for c in FINGERPRINT_FIELDS if c in raw.columns]
+    row_hash = pd.util.hash_pandas_object(raw[fields].astype(str), index=False).to_numpy()
+    # El orden de las filas importa (Patent Number/Title toman la primera)
+    position = raw.groupby(keys.to_numpy(), sort=False).cumcount().to_numpy().astype(np.uint64)
+    with np.errstate(over='ignore'):
+        mixed = row_hash * (2 * position + 1)
+    per_family = pd.DataFrame({'key': keys.to_numpy(), 'hash': mixed}).groupby('key', sort=False)['hash']
+    summary = pd.DataFrame({'hash': per_family.sum(), 'rows': per_family.size()})
+    summary['context'] = context
+    combined = pd.util.hash_pandas_object(summary, index=True).to_numpy()
+    return pd.Series([format(int(h), '016x') for h in combined], index=summary.index, name=FINGERPRINT_COLUMN)
+
+def split_changed(raw, keys, fingerprints, previous):
+    """Filas brutas a procesar (familias nuevas o cambiadas) y filas del previo a conservar."""
+    if previous.empty or FINGERPRINT_COLUMN not in previous.columns:
+        return raw, previous.iloc[0:0]
+    previous_fp = previous.set_index('family_key')[FINGERPRINT_COLUMN]
+    previous_fp = previous_fp[~previous_fp.index.duplicated()]
+    unchanged = fingerprints.index[fingerprints.eq(previous_fp.reindex(fingerprints.index)).to_numpy()]
+    carried = previous[previous['family_key'].isin(unchanged)]
+    # Copia: clean_rows escribe en las columnas de las filas a procesar
+    return raw[~keys.isin(unchanged)].copy(), carried
+
+def merge_families(processed, carried):
+    """Une las familias procesadas con las conservadas, en el orden de una ejecución completa."""
+    carried = carried.drop(columns=[FINGERPRINT_COLUMN], errors='ignore')
+    # Parquet devuelve las columnas de listas (asignatarios, países) como arrays
+    for col in carried.columns[carried.dtypes == object]:
+        if carried[col].map(lambda v: isinstance(v, np.ndarray)).any():
+            carried = carried.assign(**{col: carried[col].map(
+                lambda v: v.tolist() if isinstance(v, np.ndarray) else v)})
+    if processed.empty:
+        merged = carried
+    else:
+        merged = pd.concat([processed, carried.reindex(columns=processed.columns)], ignore_index=True)
+    # parse_patents agrupa por family_key, que queda ordenado
+    return merged.sort_values('family_key', kind='stable').reset_index(drop=True)
+
+def log_split(n_families, n_changed_rows, carried):
+    logging.info(f"Incremental: {len(carried)} de {n_families} familias sin cambios; "
+                 f"{n_families - len(carried)} nuevas o modificadas ({n_changed_rows} filas) a procesar.")
@@ -0,0 +1,162 @@
+import functools
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+# Lightweight run instrumentation.
+# span() measures wall time, CPU time (including waited-for child processes), peak RSS,
+# rows in/out and bytes read/written for a block of work. While a run is active
+# (start_run), every span is appended as one JSON line to the run's trace file; child
+# processes inherit the location through the environment, so stages that run in a
+# process pool or as separate scripts end up in the same trace.
+
+TRACE_ENV = 'PIPELINE_TRACE'
+RUN_ENV = 'PIPELINE_RUN'
+PERIOD_ENV = 'PIPELINE_PERIOD'
+# Fields copied into the manifest timing block for each span
+STAGE_FIELDS = ['name', 'wall_sec', 'cpu_sec', 'peak_rss_mb', 'rows_in', 'rows_out',
+                'bytes_read', 'bytes_written', 'cache_hit', 'status']
+
+_open_spans = []
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, so the peak is measured per span
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _children_peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+def path_bytes(paths):
+    """Total size of the given files (directories are walked); missing paths count as 0."""
+    total = 0
+    for path in paths or ():
+        if not path or not os.path.exists(path):
+            continue
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        else:
+            total += os.path.getsize(path)
+    return total
+
+def emit(record):
+    trace_path = os.environ.get(TRACE_ENV)
+    if not trace_path:
+        return
+    record = dict(record, run=os.environ.get(RUN_ENV), period=os.environ.get(PERIOD_ENV))
+    # One short write per line in append mode, so concurrent processes do not interleave
+    with open(trace_path, 'a') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+@contextmanager
+def span(name, rows_in=None, reads=(), writes=()):
+    """Measure a block of work; set record['rows_out'] (or other fields) inside the block."""
+    record = {'name': name, 'pid': os.getpid(), 'rows_in': rows_in, 'rows_out': None}
+    start = datetime.now()
+    wall0, cpu0 = time.perf_counter(), _cpu_seconds()
+    children_cpu0 = resource.getrusage(resource.RUSAGE_CHILDREN)
+    _reset_peak_rss()
+    _open_spans.append(record)
+    status = 'error'
+    try:
+        yield record
+        status = 'ok'
+    finally:
+        _open_spans.pop()
+        peak = max(_peak_rss_mb(), record.pop('_inner_peak_rss_mb', 0))
+        children_cpu1 = resource.getrusage(resource.RUSAGE_CHILDREN)
+        if children_cpu1.ru_utime + children_cpu1.ru_stime > children_cpu0.ru_utime + children_cpu0.ru_stime:
+            # The block waited for child processes (subprocess stages): report their peak too
+            peak = max(peak, _children_peak_rss_mb())
+        for parent in _open_spans:
+            # Nested spans reset the high-water mark, so hand the peak to the enclosing ones
+            parent['_inner_peak_rss_mb'] = max(parent.get('_inner_peak_rss_mb', 0), peak)
+        record.update({
+            'start': start.isoformat(),
+            'end': datetime.now().isoformat(),
+            'wall_sec': round(time.perf_counter() - wall0, 4),
+            'cpu_sec': round(_cpu_seconds() - cpu0, 4),
+            'peak_rss_mb': round(peak, 1),
+            'bytes_read': path_bytes(reads),
+            'bytes_written': path_bytes(writes),
+            'status': status,
+        })
+        logging.debug(f"span {name}: {record['wall_sec']}s wall, {record['cpu_sec']}s cpu, "
+                      f"{record['peak_rss_mb']} MB peak")
+        emit(record)
+
+def traced(name=None):
+    """Decorator: run the function inside a span, with len() of the first argument and result as rows."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rows_in = len(args[0]) if args and hasattr(args[0], '__len__') else None
+            with span(name or fn.__name__, rows_in=rows_in) as record:
+                result = fn(*args, **kwargs)
+                record['rows_out'] = len(result) if hasattr(result, '__len__') else None
+            return result
+        return wrapper
+    return decorator
+
+def start_run(period, trace_path=None):
+    """Start collecting spans for a run; without trace_path they go to a temporary file."""
+    run = {'id': uuid.uuid4().hex, 'period': period, 'trace_path': trace_path, 'keep': bool(trace_path),
+           'start': datetime.now(), 'wall0': time.perf_counter()}
+    if trace_path:
+        parent = os.path.dirname(trace_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+    else:
+        fd, run['trace_path'] = tempfile.mkstemp(prefix='pipeline_trace_', suffix='.jsonl')
+        os.close(fd)
+    os.environ[TRACE_ENV] = run['trace_path']
+    os.environ[RUN_ENV] = run['id']
+    os.environ[PERIOD_ENV] = str(period)
+    return run
+
+def read_trace(trace_path, run_id=None):
+    """Span records of a trace file, optionally only those of one run."""
+    if not os.path.exists(trace_path):
+        return []
+    with open(trace_path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return [r for r in records if run_id is None or r.get('run') == run_id]
+
+def finish_run(run):
+    """Stop collecting and return the manifest timing block (start, end, duration and stages)."""
+    for var in (TRACE_ENV, RUN_ENV, PERIOD_ENV):
+        os.environ.pop(var, None)
+    spans = read_trace(run['trace_path'], run['id'])
+    if not run['keep']:
+        os.remove(run['trace_path'])
+    return {
+        'start': run['start'].isoformat(),
+        'end': datetime.now().isoformat(),
+        'duration_sec': round(time.perf_counter() - run['wall0'], 4),
+        'stages': [{k: s.get(k) for k in STAGE_FIELDS if k in s} for s in sorted(spans, key=lambda s: s['start'])],
+    }
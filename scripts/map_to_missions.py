@@ -2,7 +2,10 @@ import argparse
 import pandas as pd
 import logging
 import json
-from utils import load_config
+import os
+from utils import load_config, file_hash
+from storage import read_table, write_table
+from instrument import traced
 
 def setup_logging():
     logging.basicConfig(
@@ -18,20 +21,47 @@ def load_cpc_map(cpc_map_path):
     df['prefix'] = df['prefix'].astype(str)
     return df
 
-def match_cpc_codes(codes, cpc_map):
+def build_cpc_index(cpc_map):
+    """Index the CPC map by upper-cased prefix for longest-prefix lookups.
+
+    Built once per run; a lookup costs one dict probe per distinct prefix length
+    instead of a scan over the whole mapping table.
+    """
+    prefixes = {}
+    for rec in cpc_map.to_dict('records'):
+        key = rec['prefix'].upper()
+        # Duplicate prefixes: keep the highest confidence (first one on ties)
+        if key not in prefixes or rec['confidence'] > prefixes[key]['confidence']:
+            prefixes[key] = rec
+    lengths = sorted({len(k) for k in prefixes}, reverse=True)
+    return {'prefixes': prefixes, 'lengths': lengths}
+
+def resolve_cpc_code(code, cpc_index):
+    """Best mapping row for one code: highest confidence, then longest prefix."""
+    best = None
+    prefixes = cpc_index['prefixes']
+    for length in cpc_index['lengths']:
+        if length > len(code):
+            continue
+        rec = prefixes.get(code[:length])
+        # Lengths are visited longest first, so only a higher confidence wins
+        if rec is not None and (best is None or rec['confidence'] > best['confidence']):
+            best = rec
+    return best
+
+def match_cpc_codes(codes, cpc_index):
+    if isinstance(cpc_index, pd.DataFrame):
+        cpc_index = build_cpc_index(cpc_index)
     matches = []
     for code in codes:
-        code = code.strip().upper()
-        matched = cpc_map[cpc_map['prefix'].apply(lambda p: code.startswith(p.upper()))]
-        if not matched.empty:
-            # Pick highest confidence, then longest prefix
-            best = matched.sort_values(['confidence', 'prefix'], ascending=[False, False]).iloc[0]
+        best = resolve_cpc_code(code.strip().upper(), cpc_index)
+        if best is not None:
             matches.append(best)
     return matches
 
-def map_row(row, cpc_map):
+def map_row(row, cpc_index):
     codes = str(row.get('CPC/IPC Codes', '')).replace(';', ',').split(',')
-    matches = match_cpc_codes(codes, cpc_map)
+    matches = match_cpc_codes(codes, cpc_index)
     if matches:
         # Primary: highest confidence, then longest prefix
         primary = sorted(matches, key=lambda m: (m['confidence'], len(m['prefix'])), reverse=True)[0]
@@ -57,16 +87,130 @@ def map_row(row, cpc_map):
         'Mapping_Method': mapping_method
     })
 
-def process(input_path, output_path, cpc_map_path, config_path):
+MATCH_COLUMNS = ['prefix', 'tech_domain', 'mission_code', 'confidence']
+
+def load_code_cache(cache_path, cpc_map_path):
+    """Load persisted code resolutions, keyed on the hash of the CPC map file.
+
+    The cache is discarded as soon as cpc_to_mission.csv changes.
+    """
+    cpc_map_hash = file_hash(cpc_map_path)
+    cache = {'cpc_map_hash': cpc_map_hash, 'codes': {}, 'hits': 0, 'misses': 0}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, 'r') as f:
+            stored = json.load(f)
+        if stored.get('cpc_map_hash') == cpc_map_hash:
+            cache['codes'] = stored.get('codes', {})
+        else:
+            logging.info("CPC map changed since the cache was written; resolving all codes again.")
+    return cache
+
+def code_cache_stats(cache):
+    lookups = cache['hits'] + cache['misses']
+    return {
+        'hits': cache['hits'],
+        'misses': cache['misses'],
+        'hit_rate': cache['hits'] / lookups if lookups else None,
+        'entries': len(cache['codes']),
+        'cpc_map_hash': cache['cpc_map_hash'],
+    }
+
+def save_code_cache(cache, cache_path):
+    parent = os.path.dirname(cache_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(cache_path, 'w') as f:
+        json.dump({
+            'cpc_map_hash': cache['cpc_map_hash'],
+            'last_run': code_cache_stats(cache),
+            'codes': cache['codes'],
+        }, f, ensure_ascii=False)
+
+def resolve_codes(codes, cpc_index, cache=None):
+    """Resolve each distinct normalized code once; unmatched codes are left out.
+
+    With a cache (see load_code_cache), only codes not seen in earlier runs are
+    resolved against the index; unmatched codes are cached as None.
+    """
+    resolved = {}
+    for code in codes:
+        if cache is not None and code in cache['codes']:
+            cache['hits'] += 1
+            match = cache['codes'][code]
+        else:
+            best = resolve_cpc_code(code, cpc_index)
+            match = [best[c] for c in MATCH_COLUMNS] if best is not None else None
+            if cache is not None:
+                cache['misses'] += 1
+                cache['codes'][code] = match
+        if match is not None:
+            resolved[code] = match
+    return pd.DataFrame.from_dict(resolved, orient='index', columns=MATCH_COLUMNS)
+
+@traced()
+def map_codes_batch(df, cpc_index, cache=None):
+    """Batch equivalent of map_row over every row of df.
+
+    Explodes 'CPC/IPC Codes' once, resolves the distinct codes once and builds the
+    mapping columns with groupby aggregations over the matched (row, code) pairs.
+    """
+    raw = df['CPC/IPC Codes'] if 'CPC/IPC Codes' in df.columns else pd.Series('', index=df.index)
+    codes = raw.astype(str).str.replace(';', ',').str.split(',')
+    codes.index = range(len(df))
+    codes = codes.explode().str.strip().str.upper()
+    matched = codes.rename('code').rename_axis('row').reset_index()
+    matched = matched.join(resolve_codes(codes.unique(), cpc_index, cache), on='code', how='inner')
+
+    out = pd.DataFrame({
+        'Primary_Domain': '',
+        'Primary_Mission': 'M0',
+        'Domain_Weights_JSON': '{}',
+        'Matched_Prefixes': '',
+        'Mapping_Method': 'UNMAPPED',
+    }, index=range(len(df)))
+    if not matched.empty:
+        # Primary: highest confidence, then longest prefix, then first code in the cell
+        matched['prefix_len'] = matched['prefix'].str.len()
+        primary = matched.sort_values(
+            ['row', 'confidence', 'prefix_len'], ascending=[True, False, False], kind='stable'
+        ).drop_duplicates('row')
+        rows = primary['row'].to_numpy()
+        out.loc[rows, 'Primary_Domain'] = primary['tech_domain'].to_numpy()
+        out.loc[rows, 'Primary_Mission'] = primary['mission_code'].to_numpy()
+        out.loc[rows, 'Mapping_Method'] = 'CPC'
+        by_row = matched.groupby('row', sort=True)
+        prefixes = by_row['prefix'].agg(';'.join)
+        out.loc[prefixes.index, 'Matched_Prefixes'] = prefixes.to_numpy()
+        # Fractional domain weights: share of the row's matched codes per domain
+        shares = matched.groupby(['row', 'tech_domain'], sort=False).size() / by_row.size()
+        weights = {}
+        for (row, domain), share in shares.items():
+            weights.setdefault(row, {})[domain] = share
+        out.loc[list(weights), 'Domain_Weights_JSON'] = [json.dumps(w) for w in weights.values()]
+    out.index = df.index
+    return out
+
+def map_missions(df, cpc_map, cache=None):
+    logging.info("Mapping CPC/IPC codes to domains and missions...")
+    cpc_index = build_cpc_index(cpc_map)
+    mapped = map_codes_batch(df, cpc_index, cache)
+    if cache is not None:
+        stats = code_cache_stats(cache)
+        logging.info(f"CPC cache: {stats['hits']} hits, {stats['misses']} misses.")
+    return pd.concat([df, mapped], axis=1)
+
+def process(input_path, output_path, cpc_map_path, config_path, cache_path=None):
     logging.info(f"Reading input file: {input_path}")
-    df = pd.read_excel(input_path)
+    df = read_table(input_path)
     config = load_config(config_path)
     cpc_map = load_cpc_map(cpc_map_path)
-    logging.info("Mapping CPC/IPC codes to domains and missions...")
-    mapped = df.apply(lambda row: map_row(row, cpc_map), axis=1)
-    df = pd.concat([df, mapped], axis=1)
+    cache_path = cache_path or config['paths'].get('cpc_cache')
+    cache = load_code_cache(cache_path, cpc_map_path) if cache_path else None
+    df = map_missions(df, cpc_map, cache)
+    if cache is not None:
+        save_code_cache(cache, cache_path)
     logging.info(f"Saving output to: {output_path}")
-    df.to_excel(output_path, index=False)
+    write_table(df, output_path)
     logging.info("Mapping completed.")
 
 def main():
@@ -75,6 +219,7 @@ def main():
     parser.add_argument('--input', required=True, help='Input Excel file path')
     parser.add_argument('--output', required=False, help='Output Excel file path')
     parser.add_argument('--cpc-map', required=False, help='CPC/IPC map CSV path')
+    parser.add_argument('--cpc-cache', required=False, help='Persistent CPC resolution cache (JSON) path')
     parser.add_argument('--config', required=True, help='Config YAML path')
     args = parser.parse_args()
     from utils import load_config
@@ -83,7 +228,7 @@ def main():
     cpc_map_path = args.cpc_map or config['paths'].get('cpc_map')
     if not output_path or not cpc_map_path:
         raise ValueError('Output and cpc_map paths must be provided via CLI or config.yaml')
-    process(args.input, output_path, cpc_map_path, args.config)
+    process(args.input, output_path, cpc_map_path, args.config, args.cpc_cache)
 
 if __name__ == "__main__":
     main()
@@ -1,7 +1,11 @@
 import argparse
+import numpy as np
 import pandas as pd
 import logging
-from utils import normalize_string, split_assignees, extract_first_date, extract_last_percentage
+from instrument import traced
+from storage import read_table, write_table
+from utils import (normalize_strings, explode_assignees, split_assignees, extract_first_dates,
+                   extract_last_percentages, normalize_cache_stats)
 
 REQUIRED_COLUMNS = [
     'Assignee Details Name', 'Patent Number', 'Publication Date', 'Title',
@@ -22,45 +26,164 @@ def validate_columns(df):
         raise ValueError(f"Missing required columns: {missing}")
     logging.info("All required columns are present.")
 
-def dedupe_family(df):
-    logging.info("Deduplicating families...")
+def family_keys(df):
     # Prefer Patent Number2 or family ID if exists, else use heuristic
     if 'Patent Number2' in df.columns:
-        df['family_key'] = df['Patent Number2'].fillna('')
-    else:
-        df['family_key'] = df.apply(lambda row: normalize_string(row['Title']) + '|' + str(row['Publication Date']), axis=1)
-    # Aggregate by family_key
-    agg_funcs = {
-        'Patent Number': 'first',
-        'Patent Number2': 'first' if 'Patent Number2' in df.columns else (lambda x: ''),
-        'Patent Valuation Score Technology': 'mean',
-        'Patent Valuation Score Legal': 'mean',
-        'Patent Valuation Score Citation': 'mean',
-        'Country Code': lambda x: list(set(x)),
-        'Assignee Details Name': lambda x: list(set(sum([split_assignees(a) for a in x], []))),
-        'Publication Date': 'max',
-        'Title': 'first',
-    }
+        return df['Patent Number2'].fillna('')
+    return normalize_strings(df['Title'].astype(str)) + '|' + df['Publication Date'].astype(str)
+
+SCORE_COLUMNS = ['Patent Valuation Score Technology', 'Patent Valuation Score Legal', 'Patent Valuation Score Citation']
+# Output column order of the family table (family_key first, Family_Size last)
+FAMILY_COLUMNS = [
+    'Patent Number', 'Patent Number2', *SCORE_COLUMNS,
+    'Country Code', 'Assignee Details Name', 'Publication Date', 'Title'
+]
+FIRST_COLUMNS = ['Patent Number', 'Patent Number2', 'Title']
+
+def _unique_lists(keys, values):
+    # Distinct values per family, in order of first appearance
+    pairs = pd.DataFrame({'family_key': keys, 'value': values}).drop_duplicates()
+    return pairs.groupby('family_key', sort=False)['value'].agg(list)
+
+def partial_families(df):
+    """Per-family partial aggregates of cleaned rows.
+
+    Scores are kept as sums and counts so partials from different chunks can be
+    merged with combine_families and turned into means by finalize_families.
+    """
+    df['family_key'] = family_keys(df)
+    grouped = df.groupby('family_key')
+    agg_funcs = {c: 'first' for c in FIRST_COLUMNS}
+    agg_funcs.update({c: 'sum' for c in SCORE_COLUMNS})
+    agg_funcs['Publication Date'] = 'max'
     # Only include keys that exist in df
-    agg_funcs = {k: v for k, v in agg_funcs.items() if k in df.columns}
-    df_agg = df.groupby('family_key').agg(agg_funcs).reset_index()
-    df_agg['Family_Size'] = df.groupby('family_key').size().values
+    part = grouped.agg({k: v for k, v in agg_funcs.items() if k in df.columns})
+    for col in SCORE_COLUMNS:
+        if col in df.columns:
+            part[col + '__count'] = grouped[col].count()
+    if 'Country Code' in df.columns:
+        part['Country Code'] = _unique_lists(df['family_key'], df['Country Code'])
+    if 'Assignee Details Name' in df.columns:
+        names = explode_assignees(df['Assignee Details Name'])
+        part['Assignee Details Name'] = _unique_lists(df['family_key'].loc[names.index], names)
+        part['Assignee Details Name'] = part['Assignee Details Name'].map(lambda x: x if isinstance(x, list) else [])
+    part['Family_Size'] = grouped.size()
+    return part
+
+def combine_families(parts):
+    """Merge partial family aggregates (in input order) into one partial."""
+    df = pd.concat(parts)
+    grouped = df.groupby(level=0)
+    agg_funcs = {c: 'first' for c in FIRST_COLUMNS}
+    agg_funcs.update({c: 'sum' for c in df.columns if c in SCORE_COLUMNS or c.endswith('__count')})
+    agg_funcs['Publication Date'] = 'max'
+    agg_funcs['Family_Size'] = 'sum'
+    combined = grouped.agg({k: v for k, v in agg_funcs.items() if k in df.columns})
+    if 'Country Code' in df.columns:
+        countries = df['Country Code'].explode()
+        combined['Country Code'] = _unique_lists(countries.index, countries.values)
+    if 'Assignee Details Name' in df.columns:
+        names = df['Assignee Details Name'].explode().dropna()
+        combined['Assignee Details Name'] = _unique_lists(names.index, names.values)
+        combined['Assignee Details Name'] = combined['Assignee Details Name'].map(
+            lambda x: x if isinstance(x, list) else [])
+    return combined
+
+def finalize_families(part):
+    """Turn a partial aggregate into the family table written by parse_patents."""
+    part = part.copy()
+    for col in SCORE_COLUMNS:
+        if col in part.columns:
+            part[col] = part[col] / part.pop(col + '__count')
+    columns = [c for c in FAMILY_COLUMNS if c in part.columns] + ['Family_Size']
+    return part[columns].rename_axis('family_key').reset_index()
+
+@traced()
+def dedupe_family(df):
+    logging.info("Deduplicating families...")
+    df_agg = finalize_families(partial_families(df))
     logging.info(f"Deduplication complete. {len(df_agg)} families found.")
     return df_agg
 
-def clean_and_parse(input_path, output_path, config=None):
-    logging.info(f"Reading input file: {input_path}")
-    df = pd.read_excel(input_path)
+def clean_rows(df):
     validate_columns(df)
-    logging.info("Cleaning columns...")
     # Clean columns
-    df['Publication Date'] = df['Publication Date'].astype(str).apply(extract_first_date)
-    for col in ['Patent Valuation Score Technology', 'Patent Valuation Score Legal', 'Patent Valuation Score Citation']:
-        df[col] = df[col].astype(str).apply(extract_last_percentage)
+    df['Publication Date'] = extract_first_dates(df['Publication Date'])
+    for col in SCORE_COLUMNS:
+        df[col] = extract_last_percentages(df[col])
     df['Assignee Details Name'] = df['Assignee Details Name'].astype(str).apply(lambda x: '\n'.join(split_assignees(x)))
-    df = dedupe_family(df)
+    return df
+
+def log_normalize_cache():
+    stats = normalize_cache_stats()
+    if stats['hit_rate'] is not None:
+        logging.info(f"Name normalization cache: {stats['hits']} hits, {stats['misses']} misses "
+                     f"({stats['hit_rate']:.1%}), {stats['size']}/{stats['maxsize']} entries.")
+
+def clean_df(df):
+    logging.info("Cleaning columns...")
+    df = dedupe_family(clean_rows(df))
+    log_normalize_cache()
+    return df
+
+def iter_raw_chunks(input_path, chunksize):
+    """Yield the raw export in DataFrames of at most chunksize rows.
+
+    CSV exports are read with pandas' chunked reader; Excel exports are streamed
+    with openpyxl in read-only mode, so the whole sheet is never held in memory.
+    """
+    if str(input_path).lower().endswith('.csv'):
+        yield from pd.read_csv(input_path, chunksize=chunksize)
+        return
+    from openpyxl import load_workbook
+    wb = load_workbook(input_path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunksize:
+                # Empty cells as NaN, as pd.read_excel reports them
+                yield pd.DataFrame(batch, columns=header).fillna(np.nan)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header).fillna(np.nan)
+    finally:
+        wb.close()
+
+def stream_clean(input_path, chunksize):
+    """Chunked equivalent of clean_df(read_table(input_path)).
+
+    Each chunk is cleaned and reduced to per-family partials that are merged as we
+    go, so peak memory depends on the chunk size and the number of families.
+    """
+    logging.info(f"Streaming input in chunks of {chunksize} rows...")
+    acc = None
+    n_rows = 0
+    for chunk in iter_raw_chunks(input_path, chunksize):
+        n_rows += len(chunk)
+        part = partial_families(clean_rows(chunk))
+        acc = part if acc is None else combine_families([acc, part])
+        logging.info(f"{n_rows} rows read, {len(acc)} families so far.")
+    if acc is None:
+        raise ValueError(f"No rows found in {input_path}")
+    df = finalize_families(acc)
+    logging.info(f"Deduplication complete. {len(df)} families found.")
+    log_normalize_cache()
+    return df
+
+def clean_and_parse(input_path, output_path, config=None, chunksize=None):
+    logging.info(f"Reading input file: {input_path}")
+    if chunksize:
+        df = stream_clean(input_path, chunksize)
+    else:
+        df = read_table(input_path)
+        df = clean_df(df)
     logging.info(f"Saving cleaned data to: {output_path}")
-    df.to_excel(output_path, index=False)
+    write_table(df, output_path)
     logging.info("Parsing and cleaning completed successfully.")
 
 def main():
@@ -69,6 +192,8 @@ def main():
     parser.add_argument('--input', required=True, help='Input Excel file path')
     parser.add_argument('--output', required=False, help='Output cleaned Excel file path')
     parser.add_argument('--config', required=False, help='Config YAML path')
+    parser.add_argument('--chunksize', type=int, required=False,
+                        help='Stream the input in chunks of this many rows (bounded memory)')
     args = parser.parse_args()
     config = None
     output_path = args.output
@@ -79,7 +204,7 @@ def main():
             output_path = config['paths']['cleaned_output']
     if not output_path:
         raise ValueError('Output path must be provided via CLI or config.yaml')
-    clean_and_parse(args.input, output_path, config)
+    clean_and_parse(args.input, output_path, config, args.chunksize)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,252 @@
+import datetime
+import functools
+import logging
+import os
+import utils
+from utils import file_hash, load_config
+import storage
+from storage import intermediate_extension, read_table, write_table
+import parse_patents
+import compute_fit_index
+import augment_flags
+import map_to_missions
+import export_views
+import generate_charts
+import delta_report
+import sensitivity
+import generate_manifest
+import history
+import incremental
+import stage_cache
+import instrument
+import scheduler
+
+# In-process pipeline engine.
+# Runs every stage in a single interpreter and hands the same DataFrame from one
+# stage to the next. Intermediate files (Parquet/Feather) are only written for the
+# requested checkpoints; the final outputs (internal table and its Excel export, public,
+# figures, delta, sensitivity, manifest) always are.
+
+CHECKPOINTS = ['cleaned', 'fit_index', 'flags']
+
+
+def build_paths(period, config):
+    ext = intermediate_extension(config)
+    return {
+        'cleaned': f"data/processed/Families_Clean_{period}{ext}",
+        'fit_index': f"data/processed/TRL2-4_Fit_Index_{period}{ext}",
+        'flags': f"data/processed/TRL2-4_Fit_Index_{period}_flags{ext}",
+        'missions': f"data/processed/TRL2-4_Fit_Index_{period}_internal{ext}",
+        'internal_xlsx': f"data/processed/TRL2-4_Fit_Index_{period}_internal.xlsx",
+        'public': f"data/processed/TRL2-4_Fit_Index_{period}_public.csv",
+        'figures_dir': f"data/figures/{period}",
+        # Optional fixed previous snapshot; by default it comes from the history
+        'previous_snapshot': config.get("previous_snapshot_path"),
+        'history': history.history_dir(config),
+        'mission_counts': history.mission_counts_dir(config),
+        'delta_out': f"data/processed/monthly_update_{period}.xlsx",
+        'sensitivity_out': f"data/processed/sensitivity_{period}.xlsx",
+        'manifest': f"logs/run_manifest_{period}.json",
+        'dashboard': os.path.join(config.get('paths', {}).get('dashboard_path')
+                                  or config.get('paths', {}).get('dasboard_path') or 'dashboard/',
+                                  f"Radar_Tecnologico_{period}.xlsx"),
+        # Optional JSON-lines trace of every span, appended run after run
+        'trace': config.get('paths', {}).get('trace'),
+        'whitelist': config.get("whitelist_path", "data/lists/whitelist.csv"),
+        'blacklist': config.get("blacklist_path", "data/lists/blacklist.csv"),
+        'cpc_map': config.get("cpc_map_path", "data/lists/cpc_to_mission.csv"),
+        'cpc_cache': config.get('paths', {}).get('cpc_cache'),
+    }
+
+
+def ensure_parent(path):
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+def checkpoint(df, name, paths, checkpoints):
+    if name in checkpoints:
+        ensure_parent(paths[name])
+        logging.info(f"Guardando checkpoint '{name}' en: {paths[name]}")
+        write_table(df, paths[name])
+
+
+def flag_stage(df, config, paths):
+    whitelist = augment_flags.load_list(paths['whitelist'])
+    blacklist = augment_flags.load_list(paths['blacklist'])
+    return augment_flags.apply_flags(df, whitelist, blacklist, config)
+
+
+def mission_stage(df, paths, resolved):
+    cpc_map = map_to_missions.load_cpc_map(paths['cpc_map'])
+    cache = None
+    if paths['cpc_cache']:
+        cache = map_to_missions.load_code_cache(paths['cpc_cache'], paths['cpc_map'])
+    df = map_to_missions.map_missions(df, cpc_map, cache)
+    if cache is not None:
+        map_to_missions.save_code_cache(cache, paths['cpc_cache'])
+    resolved.append(cache)
+    return df
+
+
+def score_head(df, config, paths, checkpoints, cache_dir=None, key=''):
+    """fit -> categorías -> flags -> misiones sobre una tabla de familias ya limpia.
+
+    Con cache_dir, cada etapa se lee de la caché de etapas si su clave (encadenada desde
+    `key`, la de la tabla limpia) no ha cambiado.
+    """
+    run_stage = functools.partial(stage_cache.run_stage, cache_dir, keep=stage_cache.stage_cache_keep(config))
+    checkpoint(df, 'cleaned', paths, checkpoints)
+    # Freshness_Flag se calcula respecto a hoy, así que la fecha forma parte de la clave
+    key = stage_cache.stage_key(key, [compute_fit_index], [config['weights'], datetime.date.today().isoformat()])
+    df = run_stage('fit_index', key, lambda: compute_fit_index.compute_fit_index(df, config['weights']), len(df))
+    key = stage_cache.stage_key(key, [compute_fit_index], config['thresholds'])
+    df = run_stage('categories', key, lambda: compute_fit_index.assign_categories(df, config['thresholds']),
+                   len(df))
+    checkpoint(df, 'fit_index', paths, checkpoints)
+    key = stage_cache.stage_key(key, [augment_flags, utils], config['eligibility'],
+                                [paths['whitelist'], paths['blacklist']])
+    df = run_stage('flags', key, lambda: flag_stage(df, config, paths), len(df))
+    checkpoint(df, 'flags', paths, checkpoints)
+    key = stage_cache.stage_key(key, [map_to_missions, utils], None, [paths['cpc_map']])
+    resolved = []
+    df = run_stage('missions', key, lambda: mission_stage(df, paths, resolved), len(df))
+    # Sin la etapa de misiones (leída de la caché) no hay estadísticas de la caché CPC
+    return df, (resolved[0] if resolved else None)
+
+
+def input_fingerprints(raw, paths):
+    context = incremental.context_hash([paths['whitelist'], paths['blacklist'], paths['cpc_map']])
+    return incremental.family_fingerprints(raw, incremental.raw_family_keys(raw), context)
+
+
+def incremental_head(raw, keys, fingerprints, period, config, paths, checkpoints):
+    """Procesa solo las familias nuevas o cambiadas y reutiliza el resto del snapshot previo.
+
+    Las normalizaciones de compute_fit_index (máximos del conjunto), las categorías y la
+    elegibilidad dependen de todas las familias, así que se recalculan tras la unión.
+    """
+    previous_period = history.previous_period(paths['history'], period)
+    previous = history.read_snapshot(paths['history'], previous_period) if previous_period else None
+    if previous is None or incremental.FINGERPRINT_COLUMN not in previous.columns:
+        logging.info("Incremental: no hay snapshot previo con huellas; se procesan todas las familias.")
+        return score_head(parse_patents.clean_df(raw), config, paths, checkpoints)
+    changed, carried = incremental.split_changed(raw, keys, fingerprints, previous)
+    incremental.log_split(len(fingerprints), len(changed), carried)
+    cache = None
+    processed = carried.iloc[0:0]
+    if len(changed):
+        processed, cache = score_head(parse_patents.clean_df(changed), config, paths, checkpoints)
+    with instrument.span('incremental_merge', rows_in=len(processed)) as record:
+        df = incremental.merge_families(processed, carried)
+        df = compute_fit_index.score(df, config)
+        df = augment_flags.eligibility_flags(df, config)
+        record['rows_out'] = len(df)
+    return df, cache
+
+
+def export_stage(df, paths):
+    with instrument.span('export', rows_in=len(df), writes=[paths['internal_xlsx'], paths['public']]):
+        export_views.export_internal(df, paths['internal_xlsx'])
+        export_views.export_public(df, paths['public'])
+
+
+def delta_stage(df, fingerprints, period, paths):
+    with instrument.span('delta', rows_in=len(df), writes=[paths['delta_out']]) as record:
+        previous = delta_report.load_previous(period, paths['history'], paths['previous_snapshot'])
+        tabs = delta_report.build_delta(df, previous)
+        delta_report.write_delta(tabs, paths['delta_out'])
+        record['rows_out'] = sum(len(tab) for tab in tabs.values())
+    snapshot = df
+    if fingerprints is not None:
+        # Las huellas solo se guardan en el histórico, para la siguiente ejecución incremental
+        snapshot = df.assign(**{incremental.FINGERPRINT_COLUMN: df['family_key'].map(fingerprints).to_numpy()})
+    # Después del delta, que lee el periodo anterior del mismo histórico
+    with instrument.span('history', rows_in=len(snapshot),
+                         writes=[os.path.join(paths['history'], f"period={period}")]):
+        history.append_snapshot(snapshot, paths['history'], period, paths['mission_counts'])
+
+
+def sensitivity_stage(df, config, paths):
+    with instrument.span('sensitivity', rows_in=len(df), writes=[paths['sensitivity_out']]) as record:
+        sens_df = sensitivity.sensitivity_table(df, config)
+        logging.info(f"Guardando resultados de sensibilidad en: {paths['sensitivity_out']}")
+        sens_df.to_excel(paths['sensitivity_out'], index=False)
+        record['rows_out'] = len(sens_df)
+
+
+def manifest_stage(df, config, period, pipeline_version, paths, cache_stats):
+    with instrument.span('manifest', rows_in=len(df), reads=[paths['missions']], writes=[paths['manifest']]):
+        run_manifest = generate_manifest.build_manifest(df, paths['missions'], config, period, pipeline_version,
+                                                        cpc_cache_stats=cache_stats)
+        generate_manifest.write_manifest(run_manifest, paths['manifest'])
+
+
+def charts_stage(df, period, config, paths):
+    with instrument.span('charts', rows_in=len(df), writes=[paths['figures_dir'], paths['dashboard']]):
+        generate_charts.render(df.copy(), period, paths['figures_dir'], config, public_path=paths['public'],
+                               delta_path=paths['delta_out'], manifest_path=paths['manifest'])
+
+
+def tail_workers(config):
+    return (config.get('scheduler') or {}).get('workers')
+
+
+def run_pipeline(input_path, period, config_path, checkpoints=(), chunksize=None, incremental_run=False,
+                 use_cache=True, workers=None, trace_path=None):
+    config = load_config(config_path)
+    paths = build_paths(period, config)
+    run = instrument.start_run(period, trace_path or paths['trace'])
+    try:
+        df = run_stages(input_path, period, config, paths, checkpoints, chunksize, incremental_run, use_cache,
+                        workers)
+    finally:
+        timing = instrument.finish_run(run)
+    generate_manifest.add_timing(paths['manifest'], timing)
+    logging.info(f"Pipeline completado en {timing['duration_sec']:.1f} s.")
+    return df
+
+
+def run_stages(input_path, period, config, paths, checkpoints, chunksize, incremental_run, use_cache, workers):
+    """Cabeza (en memoria, con caché de etapas o incremental) y etapas finales según sus dependencias."""
+    pipeline_version = config.get("pipeline_version", "0.1.0")
+    # La ejecución incremental ya reutiliza el snapshot previo; la caché de etapas es para ejecuciones completas
+    cache_dir = stage_cache.stage_cache_dir(config) if use_cache and not incremental_run else None
+    key = stage_cache.stage_key(file_hash(input_path), [parse_patents, utils, storage]) if cache_dir else ''
+    run_stage = functools.partial(stage_cache.run_stage, cache_dir, keep=stage_cache.stage_cache_keep(config))
+
+    # Cabeza del pipeline: un único DataFrame en memoria
+    logging.info(f"Leyendo archivo de entrada: {input_path}")
+    # Las huellas solo se calculan (y se guardan en el histórico) en ejecuciones incrementales
+    fingerprints = None
+    if chunksize:
+        # El export no llega a estar entero en memoria: sin huellas ni modo incremental
+        df = run_stage('cleaned', key, lambda: parse_patents.stream_clean(input_path, chunksize), reads=[input_path])
+        df, cache = score_head(df, config, paths, checkpoints, cache_dir, key)
+    elif incremental_run:
+        raw = read_table(input_path)
+        keys = incremental.raw_family_keys(raw)
+        fingerprints = input_fingerprints(raw, paths)
+        df, cache = incremental_head(raw, keys, fingerprints, period, config, paths, checkpoints)
+    else:
+        df = run_stage('cleaned', key, lambda: parse_patents.clean_df(read_table(input_path)), reads=[input_path])
+        df, cache = score_head(df, config, paths, checkpoints, cache_dir, key)
+
+    # Salidas finales
+    for key in ['missions', 'public', 'delta_out', 'sensitivity_out', 'manifest']:
+        ensure_parent(paths[key])
+    logging.info(f"Guardando salida interna en: {paths['missions']}")
+    with instrument.span('write_internal', rows_in=len(df), writes=[paths['missions']]):
+        write_table(df, paths['missions'])
+
+    # Etapas finales: el dashboard lee el CSV público, el delta y el manifest
+    cache_stats = map_to_missions.code_cache_stats(cache) if cache is not None else None
+    scheduler.run_dag({
+        'export': (export_stage, (df, paths), []),
+        'delta': (delta_stage, (df, fingerprints, period, paths), []),
+        'sensitivity': (sensitivity_stage, (df, config, paths), []),
+        'manifest': (manifest_stage, (df, config, period, pipeline_version, paths, cache_stats), []),
+        'charts': (charts_stage, (df, period, config, paths), ['export', 'delta', 'manifest']),
+    }, workers or tail_workers(config))
+    return df
@@ -6,7 +6,15 @@ import os
 # Orchestrates the monthly pipeline execution.
 
 
-def run_parse_patents(input_path, output_path, config_path=None):
+def run_traced(name, cmd, reads=(), writes=()):
+    """Run one stage script inside an instrumentation span (child CPU and peak RSS included)."""
+    import instrument
+
+    with instrument.span(name, reads=reads, writes=writes):
+        subprocess.run(cmd, check=True)
+
+
+def run_parse_patents(input_path, output_path, config_path=None, chunksize=None):
     cmd = [
         sys.executable,
         "scripts/parse_patents.py",
@@ -17,10 +25,12 @@ def run_parse_patents(input_path, output_path, config_path=None):
     ]
     if config_path:
         cmd += ["--config", config_path]
-        print(
-            f"Executant parse_patents amb entrada: {input_path} i sortida: {output_path}"
-        )
-        subprocess.run(cmd, check=True)
+    if chunksize:
+        cmd += ["--chunksize", str(chunksize)]
+    print(
+        f"Executant parse_patents amb entrada: {input_path} i sortida: {output_path}"
+    )
+    run_traced("parse_patents", cmd, [input_path], [output_path])
 
 
 def run_compute_fit_index(input_path, output_path, config_path):
@@ -37,7 +47,7 @@ def run_compute_fit_index(input_path, output_path, config_path):
     print(
         f"Executant compute_fit_index amb entrada: {input_path} i sortida: {output_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("compute_fit_index", cmd, [input_path], [output_path])
 
 
 def run_augment_flags(
@@ -60,7 +70,7 @@ def run_augment_flags(
     print(
         f"Executant augment_flags amb entrada: {input_path}, sortida: {output_path}, whitelist: {whitelist_path}, blacklist: {blacklist_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("augment_flags", cmd, [input_path], [output_path])
 
 
 def run_map_to_missions(input_path, output_path, cpc_map_path, config_path):
@@ -79,7 +89,7 @@ def run_map_to_missions(input_path, output_path, cpc_map_path, config_path):
     print(
         f"Executant map_to_missions amb entrada: {input_path}, sortida: {output_path}, cpc_map: {cpc_map_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("map_to_missions", cmd, [input_path], [output_path])
 
 
 def run_export_views(input_path, public_path, config_path):
@@ -96,10 +106,10 @@ def run_export_views(input_path, public_path, config_path):
     print(
         f"Executant export_views amb entrada: {input_path}, sortida pública: {public_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("export_views", cmd, [input_path], [public_path])
 
 
-def run_generate_charts(input_path, period, outdir, config_path):
+def run_generate_charts(input_path, period, outdir, config_path, public_path, delta_path, manifest_path):
     cmd = [
         sys.executable,
         "scripts/generate_charts.py",
@@ -111,28 +121,55 @@ def run_generate_charts(input_path, period, outdir, config_path):
         outdir,
         "--config",
         config_path,
+        "--public",
+        public_path,
+        "--delta",
+        delta_path,
+        "--manifest",
+        manifest_path,
     ]
     print(
         f"Executant generate_charts amb entrada: {input_path}, període: {period}, directori: {outdir}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("generate_charts", cmd, [input_path, public_path, delta_path, manifest_path], [outdir])
 
 
-def run_delta_report(current_path, previous_snapshot_path, delta_out_path):
+def run_delta_report(current_path, previous_snapshot_path, delta_out_path, period, history_dir):
     cmd = [
         sys.executable,
         "scripts/delta_report.py",
         "--current",
         current_path,
-        "--previous-snapshot",
-        previous_snapshot_path,
         "--delta-out",
         delta_out_path,
+        "--period",
+        period,
+        "--history-dir",
+        history_dir,
     ]
+    if previous_snapshot_path:
+        cmd += ["--previous-snapshot", previous_snapshot_path]
     print(
-        f"Executant delta_report amb actual: {current_path}, anterior: {previous_snapshot_path}, sortida: {delta_out_path}"
+        f"Executant delta_report amb actual: {current_path}, anterior: {previous_snapshot_path or history_dir}, sortida: {delta_out_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("delta_report", cmd, [current_path], [delta_out_path])
+
+
+def run_history(input_path, period, history_dir, counts_dir):
+    cmd = [
+        sys.executable,
+        "scripts/history.py",
+        "--input",
+        input_path,
+        "--period",
+        period,
+        "--history-dir",
+        history_dir,
+        "--counts-dir",
+        counts_dir,
+    ]
+    print(f"Executant history amb entrada: {input_path}, període: {period}, directori: {history_dir}")
+    run_traced("history", cmd, [input_path], [os.path.join(history_dir, f"period={period}")])
 
 
 def run_sensitivity(input_path, config_path, output_path):
@@ -147,7 +184,7 @@ def run_sensitivity(input_path, config_path, output_path):
         output_path,
     ]
     print(f"Executant sensitivity amb entrada: {input_path}, sortida: {output_path}")
-    subprocess.run(cmd, check=True)
+    run_traced("sensitivity", cmd, [input_path], [output_path])
 
 
 def run_generate_manifest(input_path, config_path, output_path, period, version):
@@ -168,56 +205,161 @@ def run_generate_manifest(input_path, config_path, output_path, period, version)
     print(
         f"Executant generate_manifest amb entrada: {input_path}, període: {period}, versió: {version}, sortida: {output_path}"
     )
-    subprocess.run(cmd, check=True)
+    run_traced("generate_manifest", cmd, [input_path], [output_path])
+
+
+def run_subprocesses(input_path, period, config_path, config, chunksize=None, workers=None, trace_path=None):
+    import instrument
+    from generate_manifest import add_timing
+    from scheduler import run_dag
+    from storage import intermediate_extension
+
+    # Paths are constructed using period; intermediates use the columnar format
+    ext = intermediate_extension(config)
+    cleaned_path = f"data/processed/Families_Clean_{period}{ext}"
+    fit_index_path = f"data/processed/TRL2-4_Fit_Index_{period}{ext}"
+    flags_path = f"data/processed/TRL2-4_Fit_Index_{period}_internal{ext}"
+    missions_path = f"data/processed/TRL2-4_Fit_Index_{period}_internal{ext}"
+    public_path = f"data/processed/TRL2-4_Fit_Index_{period}_public.csv"
+    figures_dir = f"data/figures/{period}"
+    previous_snapshot_path = config.get("previous_snapshot_path")
+    history_dir = config.get("paths", {}).get("history_dir", "data/history/snapshots")
+    counts_dir = config.get("paths", {}).get(
+        "mission_counts_dir", "data/history/mission_counts"
+    )
+    delta_out_path = f"data/processed/monthly_update_{period}.xlsx"
+    sensitivity_out_path = f"data/processed/sensitivity_{period}.xlsx"
+    manifest_path = f"logs/run_manifest_{period}.json"
+    pipeline_version = config.get("pipeline_version", "0.1.0")
+    whitelist_path = config.get("whitelist_path", "data/lists/whitelist.csv")
+    blacklist_path = config.get("blacklist_path", "data/lists/blacklist.csv")
+    cpc_map_path = config.get("cpc_map_path", "data/lists/cpc_to_mission.csv")
+
+    run = instrument.start_run(period, trace_path or config.get("paths", {}).get("trace"))
+    try:
+        run_parse_patents(input_path, cleaned_path, config_path, chunksize)
+        run_compute_fit_index(cleaned_path, fit_index_path, config_path)
+        run_augment_flags(
+            fit_index_path, flags_path, whitelist_path, blacklist_path, config_path
+        )
+        run_map_to_missions(flags_path, missions_path, cpc_map_path, config_path)
+        # Independent tail stages run concurrently; the dashboard reads the public CSV, delta and manifest
+        run_dag(
+            {
+                "export": (run_export_views, (missions_path, public_path, config_path), []),
+                "delta": (
+                    run_delta_report,
+                    (missions_path, previous_snapshot_path, delta_out_path, period, history_dir),
+                    [],
+                ),
+                "history": (run_history, (missions_path, period, history_dir, counts_dir), ["delta"]),
+                "sensitivity": (run_sensitivity, (missions_path, config_path, sensitivity_out_path), []),
+                "manifest": (
+                    run_generate_manifest,
+                    (missions_path, config_path, manifest_path, period, pipeline_version),
+                    [],
+                ),
+                "charts": (
+                    run_generate_charts,
+                    (
+                        missions_path,
+                        period,
+                        figures_dir,
+                        config_path,
+                        public_path,
+                        delta_out_path,
+                        manifest_path,
+                    ),
+                    ["export", "delta", "manifest"],
+                ),
+            },
+            workers or (config.get("scheduler") or {}).get("workers"),
+        )
+    finally:
+        timing = instrument.finish_run(run)
+    add_timing(manifest_path, timing)
+    print(f"Pipeline completat en {timing['duration_sec']:.1f} s")
 
 
 def main():
     import argparse
+    import logging
     import yaml
 
     parser = argparse.ArgumentParser(description="Run the monthly pipeline.")
     parser.add_argument("--input", required=True, help="Input Excel file (.xlsx)")
     parser.add_argument("--period", required=True, help="Period string, e.g. 2025_10")
     parser.add_argument("--config", required=True, help="Path to config.yaml")
+    parser.add_argument(
+        "--engine",
+        choices=["inprocess", "subprocess"],
+        default="inprocess",
+        help="inprocess: one interpreter, DataFrame passed in memory (default); "
+        "subprocess: one Python process per stage",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="append",
+        default=[],
+        choices=["cleaned", "fit_index", "flags"],
+        help="Intermediate output to write to disk in inprocess mode (repeatable)",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Stream the raw export in chunks of this many rows (bounded memory)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Inprocess mode: only re-score families that are new or changed since the previous snapshot",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Processes for the independent tail stages (default: scheduler.workers or CPU count)",
+    )
+    parser.add_argument(
+        "--trace",
+        help="Append per-stage timing spans to this JSON-lines file (default: paths.trace)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Inprocess mode: recompute every stage instead of reusing the stage cache",
+    )
     args = parser.parse_args()
 
     # Load config
     with open(args.config, "r") as f:
         config = yaml.safe_load(f)
 
-    period = args.period
-    input_path = args.input
+    if args.incremental and args.engine == "subprocess":
+        parser.error("--incremental requires --engine inprocess")
+    if args.engine == "subprocess":
+        run_subprocesses(
+            args.input, args.period, args.config, config, args.chunksize, args.workers, args.trace
+        )
+        return
 
-    # Paths are constructed using period
-    cleaned_path = f"data/processed/Families_Clean_{period}.xlsx"
-    fit_index_path = f"data/processed/TRL2-4_Fit_Index_{period}.xlsx"
-    flags_path = f"data/processed/TRL2-4_Fit_Index_{period}_internal.xlsx"
-    missions_path = f"data/processed/TRL2-4_Fit_Index_{period}_internal.xlsx"
-    public_path = f"data/processed/TRL2-4_Fit_Index_{period}_public.csv"
-    figures_dir = f"data/figures/{period}"
-    previous_snapshot_path = config.get(
-        "previous_snapshot_path", f"data/history/{period}_prev.xlsx"
-    )
-    delta_out_path = f"data/processed/monthly_update_{period}.xlsx"
-    sensitivity_out_path = f"data/processed/sensitivity_{period}.xlsx"
-    manifest_path = f"logs/run_manifest_{period}.json"
-    pipeline_version = config.get("pipeline_version", "0.1.0")
-    whitelist_path = config.get("whitelist_path", "data/lists/whitelist.csv")
-    blacklist_path = config.get("blacklist_path", "data/lists/blacklist.csv")
-    cpc_map_path = config.get("cpc_map_path", "data/lists/cpc_to_mission.csv")
+    from pipeline import run_pipeline
 
-    run_parse_patents(input_path, cleaned_path, args.config)
-    run_compute_fit_index(cleaned_path, fit_index_path, args.config)
-    run_augment_flags(
-        fit_index_path, flags_path, whitelist_path, blacklist_path, args.config
-    )
-    run_map_to_missions(flags_path, missions_path, cpc_map_path, args.config)
-    run_export_views(missions_path, public_path, args.config)
-    run_generate_charts(missions_path, period, figures_dir, args.config)
-    run_delta_report(missions_path, previous_snapshot_path, delta_out_path)
-    run_sensitivity(missions_path, args.config, sensitivity_out_path)
-    run_generate_manifest(
-        missions_path, args.config, manifest_path, period, pipeline_version
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=[logging.StreamHandler()],
+    )
+    print(f"Executant pipeline en procés amb entrada: {args.input}, període: {args.period}")
+    run_pipeline(
+        args.input,
+        args.period,
+        args.config,
+        checkpoints=args.checkpoint,
+        chunksize=args.chunksize,
+        incremental_run=args.incremental,
+        use_cache=not args.no_cache,
+        workers=args.workers,
+        trace_path=args.trace,
     )
     # End of pipeline
 
@@ -0,0 +1,62 @@
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Planificador de las etapas finales del pipeline.
+# Cada etapa se declara como nombre -> (función, argumentos, dependencias). Una etapa se
+# lanza en cuanto han terminado todas sus dependencias, así que las independientes
+# (export, delta, sensibilidad, manifest) corren a la vez y el tramo final tarda lo que
+# la etapa más larga en lugar de la suma de todas.
+
+def topological_order(stages):
+    """Nombres de las etapas en un orden que respeta sus dependencias (estable)."""
+    order, visiting, visited = [], set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name not in stages:
+            raise ValueError(f"Dependencia desconocida: {name}")
+        if name in visiting:
+            raise ValueError(f"Dependencia circular en la etapa: {name}")
+        visiting.add(name)
+        for dep in stages[name][2]:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+        order.append(name)
+
+    for name in stages:
+        visit(name)
+    return order
+
+def run_dag(stages, workers=None):
+    """Ejecuta las etapas respetando sus dependencias.
+
+    Con workers=1 se ejecutan en orden en este proceso; si no, las que están listas se
+    reparten en un ProcessPoolExecutor de `workers` procesos (por defecto, CPUs). El primer
+    error se propaga y las etapas que aún no habían empezado no se lanzan.
+    """
+    order = topological_order(stages)
+    workers = workers or min(len(order), os.cpu_count() or 1)
+    if workers == 1:
+        for name in order:
+            fn, args, _ = stages[name]
+            fn(*args)
+        return
+    logging.info(f"Ejecutando {len(order)} etapas con {workers} procesos")
+    pending, running, done = list(order), {}, set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for name in [n for n in pending if set(stages[n][2]) <= done]:
+                pending.remove(name)
+                fn, args, _ = stages[name]
+                logging.info(f"Lanzando etapa '{name}'")
+                running[pool.submit(fn, *args)] = name
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                # Propaga la excepción de la etapa; el with espera a las que siguen en marcha
+                future.result()
+                logging.info(f"Etapa '{name}' completada")
+                done.add(name)
@@ -2,7 +2,18 @@ import argparse
 import pandas as pd
 import logging
 from utils import load_config
+from storage import read_table
 import numpy as np
+import itertools
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+# Score components read from the processed file
+SENSITIVITY_COLUMNS = [
+    'family_key', 'Patent Valuation Score Technology', 'Patent Valuation Score Legal', 'Patent Valuation Score Citation',
+    'Freshness_Flag', 'PCT_Flag'
+]
 
 def setup_logging():
     logging.basicConfig(
@@ -12,57 +23,219 @@ def setup_logging():
     )
 
 
-def compute_fit_index(df, weights):
+def score_components(df, keys):
+    """(rows x len(keys)) matrix with the Fit Index component of each weight key.
+
+    Technology_Norm does not depend on the weights, so it is computed once here.
+    """
+    n = len(df)
     max_tech = df['Patent Valuation Score Technology'].max()
-    df['Technology_Norm'] = df['Patent Valuation Score Technology'] / max_tech * 100 if max_tech else 0
-    df['TRL_Fit_Index_raw'] = (
-        weights['technology'] * df['Technology_Norm'] +
-        weights['legal'] * df['Patent Valuation Score Legal'] +
-        weights['citation'] * df['Patent Valuation Score Citation'] +
-        weights['freshness'] * df.get('Freshness_Flag', 1) * 100 +
-        weights['pct'] * df.get('PCT_Flag', 1) * 100
-    )
-    max_fit = df['TRL_Fit_Index_raw'].max()
-    df['TRL_Fit_Index'] = df['TRL_Fit_Index_raw'] / max_fit * 100 if max_fit else 0
-    return df
-
-def assign_categories(df, thresholds):
-    df['TRL_Category'] = pd.cut(
-        df['TRL_Fit_Index'],
-        bins=[-float('inf'), thresholds['b_cut'], thresholds['a_cut'], float('inf')],
-        labels=['C', 'B', 'A']
-    )
-    return df
+    tech_norm = df['Patent Valuation Score Technology'] / max_tech * 100 if max_tech else pd.Series(0.0, index=df.index)
+    components = {
+        'technology': tech_norm,
+        'legal': df['Patent Valuation Score Legal'],
+        'citation': df['Patent Valuation Score Citation'],
+        'freshness': df['Freshness_Flag'] * 100 if 'Freshness_Flag' in df.columns else 100,
+        'pct': df['PCT_Flag'] * 100 if 'PCT_Flag' in df.columns else 100,
+    }
+    matrix = np.zeros((n, len(keys)))
+    for j, key in enumerate(keys):
+        if key in components:
+            matrix[:, j] = np.broadcast_to(np.asarray(components[key], dtype=float), n)
+    return matrix
 
-def sensitivity_analysis(input_path, config_path, output_path):
-    logging.info(f"Leyendo archivo procesado: {input_path}")
-    df = pd.read_excel(input_path)
-    config = load_config(config_path)
-    weights = config['weights']
-    thresholds = config['thresholds']
-    results = []
-    # Vary each weight +/- 20% in steps
+def weight_matrix(scenarios, keys):
+    """(len(keys) x S) matrix with one normalized weight vector per scenario."""
+    return np.array([[sc[k] for sc in scenarios] for k in keys], dtype=float).reshape(len(keys), len(scenarios))
+
+def categorize(components, weights, thresholds):
+    """Category codes (rows x S) for every scenario column: 0=C, 1=B, 2=A, -1=undefined.
+
+    Same rules as compute_fit_index/assign_categories: each column is rescaled by
+    its own max and bucketed with right-closed bins at b_cut and a_cut.
+    """
+    raw = components @ weights
+    # NaN-skipping column max (NaN when a column has no values), like Series.max
+    max_fit = np.fmax.reduce(raw, axis=0, initial=np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fit = raw / max_fit * 100
+    # A zero max makes the whole index 0, as in compute_fit_index
+    fit[:, max_fit == 0] = 0
+    codes = np.searchsorted([thresholds['b_cut'], thresholds['a_cut']], fit, side='left')
+    codes[np.isnan(fit)] = -1
+    return codes
+
+def _tally(codes, per_row):
+    counts = np.stack([(codes == k).sum(axis=0) for k in range(3)], axis=1)
+    row_counts = np.stack([(codes == k).sum(axis=1) for k in range(3)], axis=1) if per_row else None
+    return counts, row_counts
+
+# Worker state: the components matrix, memory-mapped once per process
+_worker_components = None
+
+def _init_worker(components_path):
+    global _worker_components
+    _worker_components = np.load(components_path, mmap_mode='r')
+
+def _evaluate_block(weights, thresholds, per_row):
+    return _tally(categorize(_worker_components, weights, thresholds), per_row)
+
+def sweep(components, weights, thresholds, max_block_mb=256, per_row=False, workers=1):
+    """Evaluate every scenario column of weights in blocks of bounded memory.
+
+    Returns the (S x 3) C/B/A counts per scenario and, with per_row, the (rows x 3)
+    number of scenarios in which each row fell in C/B/A (None otherwise).
+    With workers > 1 the blocks are spread over a process pool; results keep
+    scenario order.
+    """
+    n_rows, n_scen = components.shape[0], weights.shape[1]
+    # raw, fit and codes are each rows x block float64/int64 arrays (per worker)
+    block = max(1, int(max_block_mb * 2**20 // (3 * 8 * max(n_rows, 1))))
+    if workers > 1:
+        block = min(block, max(1, -(-n_scen // workers)))
+    starts = range(0, n_scen, block)
+    blocks = [weights[:, start:start + block] for start in starts]
+    if workers > 1 and len(blocks) > 1:
+        results = _sweep_parallel(components, blocks, thresholds, per_row, workers)
+    else:
+        results = (_tally(categorize(components, w, thresholds), per_row) for w in blocks)
+
+    counts = np.zeros((n_scen, 3), dtype=np.int64)
+    row_counts = np.zeros((n_rows, 3), dtype=np.int64) if per_row else None
+    for start, (block_counts, block_rows) in zip(starts, results):
+        counts[start:start + block] = block_counts
+        if per_row:
+            row_counts += block_rows
+    return counts, row_counts
+
+def _sweep_parallel(components, blocks, thresholds, per_row, workers):
+    # Components go to a .npy file that every worker memory-maps, instead of being
+    # pickled into each task; only the small weight blocks travel to the workers
+    logging.info(f"Repartiendo {len(blocks)} bloques de escenarios entre {workers} procesos...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'components.npy')
+        np.save(path, np.ascontiguousarray(components))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+            # map yields in submission order, so the output is deterministic
+            return list(pool.map(_evaluate_block, blocks, itertools.repeat(thresholds),
+                                 itertools.repeat(per_row)))
+
+def category_counts(components, weights, thresholds, max_block_mb=256, workers=1):
+    """(S x 3) counts of C/B/A per scenario."""
+    return sweep(components, weights, thresholds, max_block_mb, workers=workers)[0]
+
+def oat_scenarios(weights, deltas):
+    """One-at-a-time sweep: each weight scaled by (1 + delta), then renormalized."""
+    scenarios = []
     for key in weights:
-        for delta in np.linspace(-0.2, 0.2, 5):
+        for delta in deltas:
             new_weights = weights.copy()
             new_weights[key] = max(0, weights[key] * (1 + delta))
             # Normalize weights to sum to 1
             total = sum(new_weights.values())
-            new_weights = {k: v / total for k, v in new_weights.items()}
-            df_mod = compute_fit_index(df.copy(), new_weights)
-            df_mod = assign_categories(df_mod, thresholds)
-            counts = df_mod['TRL_Category'].value_counts().to_dict()
-            results.append({
-                'weight': key,
-                'delta': delta,
-                'A_count': counts.get('A', 0),
-                'B_count': counts.get('B', 0),
-                'C_count': counts.get('C', 0),
-                'weights': new_weights
-            })
-    res_df = pd.DataFrame(results)
+            scenarios.append(({k: v / total for k, v in new_weights.items()}, key, delta))
+    return scenarios
+
+def grid_scenarios(weights, deltas):
+    """Full factorial sweep: every combination of per-weight deltas, renormalized."""
+    scenarios = []
+    keys = list(weights)
+    for combo in itertools.product(deltas, repeat=len(keys)):
+        new_weights = {k: max(0, weights[k] * (1 + d)) for k, d in zip(keys, combo)}
+        total = sum(new_weights.values())
+        if not total:
+            continue
+        scenarios.append(({k: v / total for k, v in new_weights.items()}, 'grid', dict(zip(keys, combo))))
+    return scenarios
+
+def dirichlet_weights(weights, draws, concentration, seed=None):
+    """(K x draws) weight vectors drawn from a Dirichlet centred on the config weights.
+
+    concentration scales how tightly draws cluster around the configured weights;
+    zero weights stay at zero.
+    """
+    base = np.array(list(weights.values()), dtype=float)
+    base = base / base.sum()
+    rng = np.random.default_rng(seed)
+    sampled = np.zeros((len(base), draws))
+    active = base > 0
+    sampled[active] = rng.dirichlet(concentration * base[active], size=draws).T
+    return sampled
+
+def stability_analysis(df, config, draws=1000, concentration=100.0, seed=0, max_block_mb=256, workers=1):
+    """Monte Carlo weight sampling: per-draw counts and per-family category stability.
+
+    Stability is the fraction of draws in which a family keeps the category it gets
+    with the configured weights; share_A/B/C give the full distribution.
+    """
+    weights = config['weights']
+    thresholds = config['thresholds']
+    keys = list(weights)
+    components = score_components(df, keys)
+    sampled = dirichlet_weights(weights, draws, concentration, seed)
+    logging.info(f"Evaluando {draws} muestras Dirichlet (concentración {concentration})...")
+    counts, row_counts = sweep(components, sampled, thresholds, max_block_mb, per_row=True, workers=workers)
+
+    base = np.array([weights[k] for k in keys], dtype=float)
+    base_codes = categorize(components, (base / base.sum())[:, None], thresholds)[:, 0]
+    labels = np.array(['C', 'B', 'A', ''], dtype=object)
+    shares = row_counts / draws if draws else np.zeros_like(row_counts, dtype=float)
+    stability = pd.DataFrame({
+        'TRL_Category': labels[base_codes],
+        'share_A': shares[:, 2],
+        'share_B': shares[:, 1],
+        'share_C': shares[:, 0],
+    }, index=df.index)
+    stability['Stability'] = np.where(base_codes >= 0, shares[np.arange(len(df)), base_codes], np.nan)
+    if 'family_key' in df.columns:
+        stability.insert(0, 'family_key', df['family_key'])
+
+    scenario_df = pd.DataFrame({
+        'weight': 'dirichlet',
+        'draw': np.arange(draws),
+        'A_count': counts[:, 2],
+        'B_count': counts[:, 1],
+        'C_count': counts[:, 0],
+        'weights': [dict(zip(keys, col)) for col in sampled.T.tolist()],
+    })
+    return scenario_df, stability.sort_values('Stability', kind='stable')
+
+def sensitivity_table(df, config, mode='oat', steps=5, span=0.2, workers=1):
+    weights = config['weights']
+    thresholds = config['thresholds']
+    deltas = np.linspace(-span, span, steps)
+    scenarios = grid_scenarios(weights, deltas) if mode == 'grid' else oat_scenarios(weights, deltas)
+    logging.info(f"Evaluando {len(scenarios)} escenarios de pesos ({mode})...")
+    keys = list(weights)
+    components = score_components(df, keys)
+    counts = category_counts(components, weight_matrix([sc[0] for sc in scenarios], keys), thresholds,
+                             workers=workers)
+    results = []
+    for (new_weights, key, delta), (c_count, b_count, a_count) in zip(scenarios, counts.tolist()):
+        results.append({
+            'weight': key,
+            'delta': delta,
+            'A_count': a_count,
+            'B_count': b_count,
+            'C_count': c_count,
+            'weights': new_weights
+        })
+    return pd.DataFrame(results)
+
+def sensitivity_analysis(input_path, config_path, output_path, mode='oat', steps=5, span=0.2,
+                         draws=1000, concentration=100.0, seed=0, max_block_mb=256, workers=1):
+    logging.info(f"Leyendo archivo procesado: {input_path}")
+    df = read_table(input_path, columns=SENSITIVITY_COLUMNS)
+    config = load_config(config_path)
     logging.info(f"Guardando resultados de sensibilidad en: {output_path}")
-    res_df.to_excel(output_path, index=False)
+    if mode == 'dirichlet':
+        res_df, stability = stability_analysis(df, config, draws, concentration, seed, max_block_mb, workers)
+        with pd.ExcelWriter(output_path) as writer:
+            res_df.to_excel(writer, sheet_name='Scenarios', index=False)
+            stability.to_excel(writer, sheet_name='Stability', index=False)
+    else:
+        res_df = sensitivity_table(df, config, mode=mode, steps=steps, span=span, workers=workers)
+        res_df.to_excel(output_path, index=False)
     logging.info("Análisis de sensibilidad completado.")
 
 def main():
@@ -71,13 +244,26 @@ def main():
     parser.add_argument('--input', required=True, help='Input processed Excel file path')
     parser.add_argument('--config', required=True, help='Config YAML path')
     parser.add_argument('--output', required=False, help='Output Excel file path for sensitivity results')
+    parser.add_argument('--mode', choices=['oat', 'grid', 'dirichlet'], default='oat',
+                        help='oat: vary one weight at a time (default); grid: every combination of deltas; '
+                             'dirichlet: random weight draws with per-family stability')
+    parser.add_argument('--steps', type=int, default=5, help='Number of deltas per weight')
+    parser.add_argument('--span', type=float, default=0.2, help='Maximum relative change per weight (0.2 = +/-20%%)')
+    parser.add_argument('--draws', type=int, default=1000, help='Number of Dirichlet weight draws')
+    parser.add_argument('--concentration', type=float, default=100.0,
+                        help='Dirichlet concentration; higher keeps draws closer to the config weights')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the Dirichlet draws')
+    parser.add_argument('--memory-mb', type=int, default=256, help='Memory budget per evaluation block (MB)')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes for the scenario sweep')
     args = parser.parse_args()
     from utils import load_config
     config = load_config(args.config)
     output_path = args.output or config['paths'].get('sensitivity_output')
     if not output_path:
         raise ValueError('Output path for sensitivity results must be provided via CLI or config.yaml')
-    sensitivity_analysis(args.input, args.config, output_path)
+    sensitivity_analysis(args.input, args.config, output_path, mode=args.mode, steps=args.steps, span=args.span,
+                         draws=args.draws, concentration=args.concentration, seed=args.seed,
+                         max_block_mb=args.memory_mb, workers=args.workers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import logging
+import os
+import pandas as pd
+import instrument
+from utils import file_hash, prune_oldest
+
+# Caché de etapas del pipeline en proceso.
+# La clave de cada etapa encadena la de la etapa anterior, el código de los módulos que
+# la implementan, su parte de config.yaml y los ficheros auxiliares que lee. El resultado
+# se guarda como <etapa>/<clave>.pkl, así que una etapa cuyas entradas no han cambiado se
+# lee de disco en vez de recalcularse, y un cambio solo invalida esa etapa y las siguientes.
+# De cada etapa se conservan solo las claves usadas más recientemente (cache.stage_keep).
+
+STAGE_CACHE_DIR = 'data/cache/stages'
+STAGE_CACHE_KEEP = 3
+
+def stage_cache_dir(config):
+    return ((config or {}).get('paths') or {}).get('stage_cache', STAGE_CACHE_DIR)
+
+def stage_cache_keep(config):
+    return ((config or {}).get('cache') or {}).get('stage_keep', STAGE_CACHE_KEEP)
+
+def prune_stage(stage_dir, keep):
+    """Borra las entradas de una etapa salvo las `keep` usadas más recientemente."""
+    entries = [os.path.join(stage_dir, name) for name in os.listdir(stage_dir) if name.endswith('.pkl')]
+    removed = prune_oldest(entries, keep)
+    if removed:
+        logging.info(f"Caché de etapas: {len(removed)} entradas antiguas de '{os.path.basename(stage_dir)}' eliminadas")
+    return removed
+
+def stage_key(upstream, modules=(), config_slice=None, files=()):
+    """Hash de la clave anterior, el código de `modules`, el trozo de config y los ficheros."""
+    h = hashlib.sha256(str(upstream).encode())
+    for module in modules:
+        h.update(file_hash(module.__file__).encode())
+    h.update(json.dumps(config_slice, sort_keys=True, default=str).encode())
+    for path in files:
+        # Un fichero que no existe también forma parte de la clave
+        h.update((file_hash(path) if path and os.path.exists(path) else '-').encode())
+    return h.hexdigest()
+
+def run_stage(cache_dir, name, key, compute, rows_in=None, reads=(), keep=STAGE_CACHE_KEEP):
+    """Resultado de la etapa desde la caché, o calculado con compute() y guardado bajo su clave.
+
+    Tras guardar una entrada nueva solo se conservan las `keep` más recientes de la etapa.
+    """
+    path = os.path.join(cache_dir, name, f"{key}.pkl") if cache_dir else None
+    hit = bool(path) and os.path.exists(path)
+    with instrument.span(name, rows_in=rows_in, reads=[path] if hit else reads,
+                         writes=[path] if path and not hit else ()) as record:
+        record['cache_hit'] = hit
+        if hit:
+            logging.info(f"Etapa '{name}' sin cambios; se reutiliza {path}")
+            result = pd.read_pickle(path)
+            # Marca la entrada como usada, para que la poda la conserve
+            os.utime(path)
+        else:
+            result = compute()
+            if path:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Pickle conserva listas y categorías tal cual; el rename evita dejar entradas a medias
+                tmp_path = f"{path}.tmp"
+                pd.to_pickle(result, tmp_path)
+                os.replace(tmp_path, path)
+                prune_stage(os.path.dirname(path), keep)
+        record['rows_out'] = len(result)
+    return result
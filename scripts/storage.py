@@ -0,0 +1,168 @@
+import logging
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# Storage layer for pipeline artifacts.
+# Intermediates (data/processed) are stored as Parquet or Arrow IPC (Feather) so that
+# readers can memory-map the file and load only the columns they need. Excel and CSV
+# are still supported for the human-facing exports and for legacy inputs.
+
+COLUMNAR_EXTENSIONS = ('.parquet', '.feather', '.arrow')
+
+
+def intermediate_extension(config):
+    """File extension for intermediates from config['storage']['format'] (parquet by default)."""
+    fmt = ((config or {}).get('storage') or {}).get('format', 'parquet')
+    if fmt not in ('parquet', 'feather'):
+        raise ValueError(f"Unsupported storage format: {fmt}")
+    return '.' + fmt
+
+
+def _extension(path):
+    return os.path.splitext(str(path))[1].lower()
+
+
+def is_columnar(path):
+    return _extension(path) in COLUMNAR_EXTENSIONS
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        logging.error("pyarrow not installed. Run 'pip install pyarrow'.")
+        raise
+
+
+def table_columns(path):
+    """Column names stored in path, without loading the data."""
+    ext = _extension(path)
+    if ext == '.parquet':
+        _require_pyarrow()
+        import pyarrow.parquet as pq
+        return pq.read_schema(path).names
+    if ext in ('.feather', '.arrow'):
+        _require_pyarrow()
+        import pyarrow.ipc as ipc
+        import pyarrow as pa
+        with pa.memory_map(str(path)) as source:
+            return ipc.open_file(source).schema.names
+    if ext == '.csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    return list(pd.read_excel(path, nrows=0).columns)
+
+
+def _lists_from_arrays(df):
+    # Arrow list columns (Country Code, assignees) come back as numpy arrays;
+    # hand them to the stages as plain lists, as the in-process engine does
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        non_null = df[col].dropna()
+        if not non_null.empty and isinstance(non_null.iloc[0], np.ndarray):
+            df[col] = df[col].map(lambda v: v.tolist() if isinstance(v, np.ndarray) else v)
+    return df
+
+
+def read_table(path, columns=None):
+    """Read a table by extension. Requested columns missing from the file are ignored."""
+    if columns is not None:
+        available = table_columns(path)
+        columns = [c for c in columns if c in available]
+    ext = _extension(path)
+    if ext == '.parquet':
+        _require_pyarrow()
+        return _lists_from_arrays(pd.read_parquet(path, columns=columns, memory_map=True))
+    if ext in ('.feather', '.arrow'):
+        _require_pyarrow()
+        import pyarrow.feather as feather
+        return _lists_from_arrays(feather.read_table(path, columns=columns, memory_map=True).to_pandas())
+    if ext == '.csv':
+        return pd.read_csv(path, usecols=columns)
+    return pd.read_excel(path, usecols=columns)
+
+
+def _arrow_safe(df):
+    # Arrow needs one type per column; mixed object columns (e.g. numeric and text
+    # patent numbers) are stored as text, keeping missing values as nulls.
+    import pyarrow as pa
+    out = df
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            if out is df:
+                out = df.copy()
+            out[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return out
+
+
+def write_table(df, path):
+    """Write a table by extension (.parquet, .feather/.arrow, .csv or .xlsx)."""
+    ext = _extension(path)
+    if ext == '.parquet':
+        _require_pyarrow()
+        _arrow_safe(df).to_parquet(path, index=False)
+    elif ext in ('.feather', '.arrow'):
+        _require_pyarrow()
+        # Uncompressed IPC files can be memory-mapped without a decode step
+        _arrow_safe(df).reset_index(drop=True).to_feather(path, compression='uncompressed')
+    elif ext == '.csv':
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def partition_values(root, column):
+    """Values of the Hive-style partitions root/<column>=<value>/, sorted."""
+    if not os.path.isdir(root):
+        return []
+    prefix = column + '='
+    return sorted(name[len(prefix):] for name in os.listdir(root)
+                  if name.startswith(prefix) and os.path.isdir(os.path.join(root, name)))
+
+
+def write_partition(df, root, column, value):
+    """Write df as partition root/<column>=<value>/ (Parquet), replacing any previous copy."""
+    _require_pyarrow()
+    part_dir = os.path.join(root, f"{column}={value}")
+    # Written beside the dataset first; names starting with '_' are ignored by readers
+    tmp_dir = os.path.join(root, f"_{column}={value}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    write_table(df.drop(columns=[column], errors='ignore'), os.path.join(tmp_dir, 'part-0.parquet'))
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.replace(tmp_dir, part_dir)
+
+
+def read_partitions(root, column, values=None, columns=None, filter=None):
+    """Read a Hive-partitioned Parquet dataset, scanning only the requested partitions.
+
+    values restricts the partitions read; filter is an extra pyarrow.dataset expression
+    pushed down to the scan (e.g. on family_key). The partition column is always
+    returned, as text.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    partitioning = ds.partitioning(pa.schema([(column, pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning)
+    # Snapshots from different runs may differ in columns or null-only types
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if schemas:
+        try:
+            schema = pa.unify_schemas(schemas, promote_options='permissive')
+        except TypeError:
+            schema = pa.unify_schemas(schemas)
+        dataset = ds.dataset(root, format='parquet', partitioning=partitioning,
+                             schema=schema.append(pa.field(column, pa.string())))
+    expr = ds.field(column).isin(list(values)) if values is not None else None
+    if filter is not None:
+        expr = filter if expr is None else expr & filter
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names and c != column] + [column]
+    return _lists_from_arrays(dataset.to_table(columns=columns, filter=expr).to_pandas())
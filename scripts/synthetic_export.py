@@ -0,0 +1,111 @@
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+from parse_patents import REQUIRED_COLUMNS
+
+# Exports sintéticos con el formato del proveedor, para medir el pipeline sin datos reales.
+# Las filas se agrupan en familias (mismo título y primera fecha de publicación) de tamaño
+# geométrico, con varios titulares por celda separados por saltos de línea, puntuaciones
+# como texto con porcentajes y códigos CPC/IPC que mezclan prefijos de cpc_to_mission.csv
+# con códigos sin mapear.
+
+EXPORT_COLUMNS = REQUIRED_COLUMNS + ['Country Code', 'CPC/IPC Codes', 'Dead or Alive', 'Litigation Exists']
+
+TOPICS = ['Óptica', 'Baterías de estado sólido', 'Terapia génica', 'Redes móviles', 'Gestión de datos',
+          'Catálisis', 'Biomateriales', 'Sensores cuánticos', 'Hidrógeno verde', 'Visión artificial']
+INSTITUTIONS = ['Universitat de Barcelona', 'Universitat Politècnica de Catalunya', 'CSIC',
+                'Fundació Tècnica', 'Institut de Ciències Fotòniques', 'Hospital Clínic',
+                'Universidad Autónoma de Madrid', 'Centre Tecnològic']
+COMPANY_FORMS = ['SL', 'SA', 'GmbH', 'Ltd', 'Inc', 'Corp', 'BV', 'AG']
+CPC_CODES = ['C12N15/11', 'C12N5/00', 'C12N9/02', 'H04W12/08', 'H04W4/00', 'G06F16/22', 'G06F16/901',
+             'A61K9/00', 'A61K38/17', 'B01J3/00', 'G06F3/01', 'H01M10/0562', 'G01N33/53', 'C25B1/04']
+COUNTRIES = ['ES', 'EP', 'WO', 'US', 'DE', 'FR', 'CN', 'JP']
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+def assignee_pool(n_companies=400, institution_share=0.8):
+    """Instituciones (que no son empresas) y empresas con forma jurídica, con su probabilidad."""
+    companies = [f"Empresa {i} {COMPANY_FORMS[i % len(COMPANY_FORMS)]}" for i in range(n_companies)]
+    weights = ([institution_share / len(INSTITUTIONS)] * len(INSTITUTIONS)
+               + [(1 - institution_share) / n_companies] * n_companies)
+    return np.array(INSTITUTIONS + companies, dtype=object), np.array(weights)
+
+def join_samples(pool, counts, rng, p=None):
+    """Para cada fila, `count` elementos del pool unidos por salto de línea."""
+    picks = rng.choice(pool, size=counts.sum(), p=p)
+    owners = np.repeat(np.arange(len(counts)), counts)
+    return pd.Series(picks).groupby(owners).agg('\n'.join).reindex(range(len(counts)), fill_value='')
+
+def percentages(values):
+    return pd.Series(values).round(1).astype(str) + '%'
+
+def generate_export(rows, seed=0, mean_family_size=3.0):
+    """DataFrame de `rows` filas con las columnas del export (EXPORT_COLUMNS)."""
+    rng = np.random.default_rng(seed)
+    # Tamaños de familia geométricos hasta cubrir `rows` filas
+    sizes = rng.geometric(1 / mean_family_size, size=rows)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), rows) + 1]
+    sizes[-1] -= sizes.sum() - rows
+    n_families = len(sizes)
+    family = np.repeat(np.arange(n_families), sizes)
+
+    # Campos por familia, repetidos en cada una de sus filas
+    topics = np.array(TOPICS, dtype=object)[rng.integers(0, len(TOPICS), n_families)]
+    titles = pd.Series(topics).radd('Método y dispositivo de ') + ' ' + pd.Series(np.arange(n_families)).astype(str)
+    first_dates = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 365 * 11, n_families), unit='D')
+    pool, weights = assignee_pool()
+    assignees = join_samples(pool, rng.integers(1, 4, n_families), rng, weights)
+    pct_family = rng.random(n_families) < 0.3
+
+    row_dates = first_dates[family]
+    later = row_dates + pd.to_timedelta(rng.integers(30, 900, rows), unit='D')
+    publication = np.asarray(row_dates.strftime('%Y-%m-%d'), dtype=object)
+    later = np.asarray(later.strftime('%Y-%m-%d'), dtype=object)
+    # Una de cada cinco filas lleva fechas posteriores en la misma celda
+    publication = np.where(rng.random(rows) < 0.2, publication + '\n' + later, publication)
+    prefix = np.where(pct_family[family], 'WO', np.array(COUNTRIES, dtype=object)[rng.integers(0, 3, rows)])
+    citation = percentages(rng.uniform(0, 100, rows)).to_numpy()
+    citation = np.where(rng.random(rows) < 1 / 7, None, citation)
+    df = pd.DataFrame({
+        'Assignee Details Name': assignees.to_numpy()[family],
+        'Patent Number': prefix + pd.Series(np.arange(rows) + 100000).astype(str).to_numpy(),
+        'Publication Date': publication,
+        'Title': titles.to_numpy()[family],
+        'Patent Valuation Score Technology': (percentages(rng.uniform(0, 100, rows)) + ' / '
+                                              + percentages(rng.uniform(0, 100, rows))).to_numpy(),
+        'Patent Valuation Score Legal': percentages(rng.uniform(0, 100, rows)).to_numpy(),
+        'Patent Valuation Score Citation': citation,
+        'Country Code': np.array(COUNTRIES, dtype=object)[rng.integers(0, len(COUNTRIES), rows)],
+        'CPC/IPC Codes': join_samples(np.array(CPC_CODES, dtype=object), rng.integers(0, 4, rows), rng)
+                         .str.replace('\n', '; ').to_numpy(),
+        'Dead or Alive': np.where(rng.random(rows) < 0.75, 'Alive', 'Dead'),
+        'Litigation Exists': np.where(rng.random(rows) < 0.1, 'Yes', 'No'),
+    })
+    return df[EXPORT_COLUMNS]
+
+def write_export(df, output_path):
+    if str(output_path).lower().endswith('.csv'):
+        df.to_csv(output_path, index=False)
+    else:
+        df.to_excel(output_path, index=False)
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw patent export.")
+    parser.add_argument('--rows', type=int, required=True, help='Number of rows')
+    parser.add_argument('--output', required=True, help='Output path (.csv or .xlsx)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--family-size', type=float, default=3.0, help='Mean rows per family')
+    args = parser.parse_args()
+    df = generate_export(args.rows, args.seed, args.family_size)
+    logging.info(f"Export sintético: {len(df)} filas; guardando en {args.output}")
+    write_export(df, args.output)
+
+if __name__ == "__main__":
+    main()
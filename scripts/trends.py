@@ -0,0 +1,99 @@
+import argparse
+import logging
+import pandas as pd
+import history
+from storage import read_partitions
+
+# Consultas de tendencias sobre el histórico de snapshots.
+# Las trayectorias y transiciones leen solo las columnas necesarias del histórico
+# particionado; los recuentos por misión salen de agregados por periodo que se
+# calculan una vez (al guardar el snapshot, o aquí si faltan) y se reutilizan.
+
+CATEGORIES = ['A', 'B', 'C']
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        handlers=[logging.StreamHandler()]
+    )
+
+def select_periods(root, last=None, periods=None):
+    """Periodos pedidos que existen en el histórico, o los `last` más recientes."""
+    stored = history.list_periods(root)
+    if periods:
+        missing = sorted(set(periods) - set(stored))
+        if missing:
+            raise ValueError(f"Periodos no encontrados en el histórico: {', '.join(missing)}")
+        return sorted(periods)
+    return stored[-last:] if last else stored
+
+def fit_trajectories(root, periods=None, family_keys=None):
+    """TRL_Fit_Index por familia (filas) y periodo (columnas)."""
+    import pyarrow.dataset as ds
+    key_filter = ds.field('family_key').isin(list(family_keys)) if family_keys is not None else None
+    df = read_partitions(root, 'period', periods, columns=['family_key', 'TRL_Fit_Index'], filter=key_filter)
+    return df.pivot_table(index='family_key', columns='period', values='TRL_Fit_Index', aggfunc='first')
+
+def transition_matrix(root, from_period, to_period):
+    """Familias por categoría en from_period (filas) y en to_period (columnas).
+
+    Las familias que no están en un periodo aparecen como NEW (fila) o DROPPED (columna).
+    """
+    df = read_partitions(root, 'period', [from_period, to_period], columns=['family_key', 'TRL_Category'])
+    df['TRL_Category'] = df['TRL_Category'].astype(object).fillna('N/A')
+    wide = df.pivot_table(index='family_key', columns='period', values='TRL_Category', aggfunc='first')
+    wide = wide.reindex(columns=[from_period, to_period])
+    matrix = pd.crosstab(wide[from_period].fillna('NEW'), wide[to_period].fillna('DROPPED'))
+    rows = CATEGORIES + [c for c in matrix.index if c not in CATEGORIES]
+    cols = CATEGORIES + [c for c in matrix.columns if c not in CATEGORIES]
+    matrix = matrix.reindex(index=rows, columns=cols, fill_value=0)
+    matrix.index.name, matrix.columns.name = from_period, to_period
+    return matrix
+
+def mission_trend(root, counts_root, periods=None, category=None):
+    """Familias por Primary_Mission (columnas) y periodo (filas), opcionalmente de una categoría."""
+    history.update_counts(root, counts_root)
+    counts = read_partitions(counts_root, 'period', periods)
+    if category is not None:
+        counts = counts[counts['TRL_Category'].astype(object) == category]
+    counts = counts.assign(Primary_Mission=counts['Primary_Mission'].astype(object).fillna('N/A'))
+    return counts.pivot_table(index='period', columns='Primary_Mission', values='count',
+                              aggfunc='sum', fill_value=0)
+
+def trends_report(root, counts_root, output_path, last=None, periods=None, from_period=None,
+                  to_period=None, family_keys=None):
+    """Excel con trayectorias, matriz de transición y recuentos por misión."""
+    selected = select_periods(root, last, periods)
+    if not selected:
+        raise ValueError(f"No hay periodos en el histórico: {root}")
+    from_period = from_period or (selected[-2] if len(selected) > 1 else selected[0])
+    to_period = to_period or selected[-1]
+    logging.info(f"Calculando tendencias de {len(selected)} periodos ({selected[0]} a {selected[-1]})")
+    with pd.ExcelWriter(output_path) as writer:
+        fit_trajectories(root, selected, family_keys).to_excel(writer, sheet_name='Trajectories')
+        transition_matrix(root, from_period, to_period).to_excel(writer, sheet_name='Transitions')
+        mission_trend(root, counts_root, selected).to_excel(writer, sheet_name='Missions')
+        mission_trend(root, counts_root, selected, category='A').to_excel(writer, sheet_name='Missions_A')
+    logging.info(f"Tendencias guardadas en: {output_path}")
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Multi-period trends from the snapshot history.")
+    parser.add_argument('--output', required=True, help='Output Excel file path')
+    parser.add_argument('--config', required=False, help='Config YAML path (history locations)')
+    parser.add_argument('--last', type=int, help='Only the most recent N periods (e.g. 24)')
+    parser.add_argument('--periods', nargs='+', help='Explicit list of periods (YYYY_MM)')
+    parser.add_argument('--from-period', help='Transition matrix start period (default: second to last)')
+    parser.add_argument('--to-period', help='Transition matrix end period (default: last)')
+    parser.add_argument('--family', action='append', help='Restrict trajectories to this family_key (repeatable)')
+    args = parser.parse_args()
+    config = None
+    if args.config:
+        from utils import load_config
+        config = load_config(args.config)
+    trends_report(history.history_dir(config), history.mission_counts_dir(config), args.output, args.last,
+                  args.periods, args.from_period, args.to_period, args.family)
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,102 @@
 import unicodedata
 import re
+import hashlib
+import os
+from functools import lru_cache
 import pandas as pd
 from typing import List
 import yaml
 
+DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})')
+PERCENT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)%')
+# Same as PERCENT_PATTERN, but only where no other percentage follows (the last findall match)
+LAST_PERCENT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)%(?!.*\d%)', re.S)
+NON_ALNUM_PATTERN = re.compile(r'[^A-Z0-9\s]')
+ASSIGNEE_SEPARATOR_PATTERN = re.compile(r'\n|\r|;')
+
+def _on_unique(s: pd.Series, extract) -> pd.Series:
+    # Export cells repeat heavily, so the work runs once per distinct value
+    codes, uniques = pd.factorize(s.astype(str))
+    values = extract(pd.Series(uniques, dtype=object)).to_numpy()
+    return pd.Series(values.take(codes), index=s.index, name=s.name)
+
+# Distinct names kept by the normalize_string memo; see normalize_cache_stats()
+NORMALIZE_CACHE_SIZE = 2 ** 16
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_string(s: str) -> str:
-    """Normalize string: uppercase, remove accents, symbols."""
+    """Normalize string: uppercase, remove accents, symbols. Memoized (LRU)."""
     s = s.upper()
-    s = ''.join(c for c in unicodedata.normalize('NFD', s)
-                if unicodedata.category(c) != 'Mn')
-    s = re.sub(r'[^A-Z0-9\s]', '', s)
+    # ASCII strings have no accents to strip, so skip the unicodedata pass
+    if not s.isascii():
+        s = ''.join(c for c in unicodedata.normalize('NFD', s)
+                    if unicodedata.category(c) != 'Mn')
+    s = NON_ALNUM_PATTERN.sub('', s)
     return s.strip()
 
+def normalize_cache_stats() -> dict:
+    """Hit/miss counters of the normalize_string memo, to size NORMALIZE_CACHE_SIZE."""
+    info = normalize_string.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else None,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+    }
+
 def split_assignees(assignee_str: str) -> List[str]:
     """Split assignees by line breaks and normalize."""
-    return list({normalize_string(a) for a in re.split(r'\n|\r|;', assignee_str) if a.strip()})
+    return list({normalize_string(a) for a in ASSIGNEE_SEPARATOR_PATTERN.split(assignee_str) if a.strip()})
+
+def normalize_strings(s: pd.Series) -> pd.Series:
+    """normalize_string over a Series, once per distinct value (through the memo)."""
+    return _on_unique(s, lambda u: u.map(normalize_string))
+
+def explode_assignees(s: pd.Series) -> pd.Series:
+    """Vectorized split_assignees: one normalized name per row, index repeated per cell."""
+    names = s.astype(str).str.split(ASSIGNEE_SEPARATOR_PATTERN).explode()
+    names = names[names.str.strip().astype(bool)]
+    return normalize_strings(names)
 
 def extract_first_date(date_str: str) -> str:
     """Extract first date in YYYY-MM-DD format from cell."""
-    match = re.search(r'(\d{4}-\d{2}-\d{2})', date_str)
+    match = DATE_PATTERN.search(date_str)
     return match.group(1) if match else ''
 
+def extract_first_dates(s: pd.Series) -> pd.Series:
+    """Vectorized extract_first_date; missing cells and cells without a date give ''."""
+    return _on_unique(s, lambda u: u.str.extract(DATE_PATTERN, expand=False).fillna(''))
+
 
 def extract_last_percentage(score_str: str) -> float:
     """Extract last percentage from string and convert to float."""
-    matches = re.findall(r'(\d+(?:\.\d+)?)%', score_str)
+    matches = PERCENT_PATTERN.findall(score_str)
     return float(matches[-1]) if matches else None
 
+def extract_last_percentages(s: pd.Series) -> pd.Series:
+    """Vectorized extract_last_percentage; cells without a percentage give NaN."""
+    return _on_unique(s, lambda u: u.str.extract(LAST_PERCENT_PATTERN, expand=False)).astype(float)
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(8192)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def prune_oldest(paths, keep):
+    """Delete all but the `keep` most recently modified files; returns the deleted paths."""
+    ordered = sorted(paths, key=os.path.getmtime, reverse=True)
+    removed = ordered[max(keep, 0):]
+    for path in removed:
+        os.remove(path)
+    return removed
+
 def load_config(config_path):
     with open(config_path, 'r') as f:
         return yaml.safe_load(f)
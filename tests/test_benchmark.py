@@ -0,0 +1,15 @@
+import os
+import benchmark
+from utils import load_config
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_benchmark_exercises_the_mapping(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO)
+    results = benchmark.run_benchmark(2000, load_config('config.yaml'), bench_dir=str(tmp_path), workers=1)
+
+    by_stage = {r['name']: r for r in results}
+    assert set(by_stage) == set(benchmark.STAGES)
+    assert by_stage['map']['rows_in'] == by_stage['dedupe']['rows_out']
+    assert 0 < by_stage['map']['mapped_share'] < 1
@@ -0,0 +1,83 @@
+import os
+import sys
+import pandas as pd
+import yaml
+import cli
+from storage import write_table
+
+
+def run_cli(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['cli.py', *argv])
+    cli.main()
+
+
+def test_export_with_parquet_input_keeps_the_input(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        'family_key': ['f1', 'f2', 'f3'],
+        'Primary_Mission': ['M1', 'M1', 'M2'],
+        'Primary_Domain': ['D1', 'D1', 'D2'],
+        'TRL_Category': ['A', 'B', 'C'],
+        'PCT_Flag': [1, 0, 1],
+        'Technology_Norm': [90.0, 50.0, 10.0],
+    })
+    input_path = tmp_path / 'fit_internal.parquet'
+    write_table(df, input_path)
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump({'paths': {}}))
+
+    run_cli(monkeypatch, 'export', '--input', str(input_path), '--public', str(tmp_path / 'public.csv'),
+            '--config', str(config_path))
+
+    pd.testing.assert_frame_equal(pd.read_parquet(input_path), df)
+    assert pd.read_excel(tmp_path / 'fit_internal.xlsx')['family_key'].tolist() == ['f1', 'f2', 'f3']
+    assert pd.read_csv(tmp_path / 'public.csv')['families_count'].sum() == 3
+
+
+def test_sensitivity_passes_mode_and_workers(tmp_path, monkeypatch):
+    n = 40
+    df = pd.DataFrame({
+        'family_key': [f"f{i}" for i in range(n)],
+        'Patent Valuation Score Technology': [float(i % 10) * 10 for i in range(n)],
+        'Patent Valuation Score Legal': [float(i % 7) * 14 for i in range(n)],
+        'Patent Valuation Score Citation': [float(i % 5) * 20 for i in range(n)],
+        'Freshness_Flag': [i % 2 for i in range(n)],
+        'PCT_Flag': [i % 3 == 0 for i in range(n)],
+    })
+    input_path = tmp_path / 'fit_internal.parquet'
+    write_table(df, input_path)
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump({
+        'weights': {'technology': 0.4, 'legal': 0.15, 'citation': 0.1, 'freshness': 0.1, 'pct': 0.05},
+        'thresholds': {'a_cut': 66, 'b_cut': 33},
+        'paths': {},
+    }))
+    output_path = tmp_path / 'sensitivity.xlsx'
+
+    run_cli(monkeypatch, 'sensitivity', '--input', str(input_path), '--config', str(config_path),
+            '--output', str(output_path), '--mode', 'dirichlet', '--draws', '20', '--workers', '2',
+            '--memory-mb', '0')
+
+    scenarios = pd.read_excel(output_path, sheet_name='Scenarios')
+    assert scenarios['draw'].tolist() == list(range(20))
+    assert 'delta' not in scenarios.columns
+    assert len(pd.read_excel(output_path, sheet_name='Stability')) == n
+
+
+def test_history_commands_use_the_configured_locations(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump({'paths': {'history_dir': 'hist/snapshots',
+                                                     'mission_counts_dir': 'hist/counts'}}))
+    df = pd.DataFrame({'family_key': ['f1', 'f2'], 'TRL_Category': ['A', 'B'], 'TRL_Fit_Index': [90.0, 40.0],
+                       'Primary_Mission': ['M1', 'M2']})
+    write_table(df, tmp_path / 'internal.parquet')
+
+    for period in ['2025_09', '2025_10']:
+        run_cli(monkeypatch, 'history', '--input', 'internal.parquet', '--period', period)
+    run_cli(monkeypatch, 'trends', '--output', 'trends.xlsx')
+    run_cli(monkeypatch, 'delta', '--current', 'internal.parquet', '--period', '2025_10', '--delta-out', 'delta.xlsx')
+
+    assert sorted(os.listdir('hist/snapshots')) == ['period=2025_09', 'period=2025_10']
+    assert sorted(os.listdir('hist/counts')) == ['period=2025_09', 'period=2025_10']
+    assert not os.path.exists('data')
+    assert pd.read_excel('delta.xlsx', sheet_name='NEW').empty
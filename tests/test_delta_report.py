@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+from delta_report import build_delta
+
+pytestmark = pytest.mark.filterwarnings('error::FutureWarning')
+
+
+def snapshot(raw, categories):
+    return pd.DataFrame({
+        'family_key': [f"f{i}" for i in range(len(raw))],
+        'TRL_Fit_Index': [r / max(raw) * 100 for r in raw],
+        'TRL_Category': categories,
+        'VB_Eligible': [1] * len(raw),
+        'VB_Exclusion_Reason': [''] * len(raw),
+        'Primary_Mission': ['M1'] * len(raw),
+    })
+
+
+def test_change_log_ignores_a_moving_cohort_maximum():
+    previous = snapshot([90.0, 50.0, 40.0, 10.0], ['A', 'B', 'B', 'C'])
+    # Only the top family's raw score moves; every normalized score shifts with it
+    current = snapshot([99.0, 50.0, 40.0, 10.0], ['A', 'B', 'B', 'C'])
+
+    tabs = build_delta(current, previous)
+
+    assert tabs['CHANGE_LOG'].empty
+    assert all(tabs[tab].empty for tab in ['NEW', 'DROPPED', 'UPGRADED', 'DOWNGRADED', 'EXCLUDED_BY_RULE'])
+
+
+def test_change_log_records_category_transitions():
+    previous = snapshot([90.0, 50.0, 40.0, 10.0], ['A', 'B', 'B', 'C'])
+    current = snapshot([99.0, 50.0, 40.0, 10.0], ['A', 'B', 'C', 'C'])
+
+    log = build_delta(current, previous)['CHANGE_LOG']
+
+    assert log.to_dict('records') == [{'family_key': 'f2', 'field': 'TRL_Category', 'old': 'B', 'new': 'C'}]
+
+
+def test_new_and_dropped_families():
+    previous = snapshot([90.0, 50.0, 40.0], ['A', 'B', 'B'])
+    current = snapshot([90.0, 50.0], ['A', 'B'])
+    current.loc[1, 'family_key'] = 'f9'
+
+    tabs = build_delta(current, previous)
+
+    assert tabs['NEW']['family_key'].tolist() == ['f9']
+    assert tabs['DROPPED']['family_key'].tolist() == ['f1', 'f2']
+    assert list(tabs['DROPPED'].columns) == list(tabs['NEW'].columns)
+
+
+def test_disjoint_snapshots():
+    previous = snapshot([90.0, 50.0], ['A', 'B']).astype({'TRL_Category': 'category'})
+    current = snapshot([80.0, 20.0, 10.0], ['A', 'C', 'C']).assign(family_key=['g0', 'g1', 'g2'])
+
+    tabs = build_delta(current, previous)
+
+    assert len(tabs['NEW']) == 3 and len(tabs['DROPPED']) == 2
+    assert tabs['CHANGE_LOG'].empty
@@ -0,0 +1,47 @@
+import os
+import pandas as pd
+import generate_charts
+from generate_charts import _slice_dir, chart_jobs, render_charts
+
+
+def families():
+    return pd.DataFrame({
+        'family_key': ['f1', 'f2', 'f3', 'f4'],
+        'TRL_Category': ['A', 'B', 'C', 'A'],
+        'TRL_Fit_Index': [90.0, 50.0, 10.0, 70.0],
+        'Patent Valuation Score Technology': [80.0, 40.0, 20.0, 60.0],
+        'Patent Valuation Score Legal': [70.0, 30.0, 10.0, 50.0],
+        'Patent Valuation Score Citation': [60.0, 20.0, 5.0, 40.0],
+        'Publication Date': ['2024-01-10', '2024-02-11', '2024-02-12', '2024-03-13'],
+        'Primary_Mission': ['M1/A', 'M1 A', 'M2', 'M2'],
+    })
+
+
+def test_slice_dirs_keep_distinct_values_apart():
+    assert _slice_dir('M1/A') != _slice_dir('M1 A')
+    dirs = {os.path.dirname(path) for _, _, path, _ in chart_jobs(families(), 'out')}
+    assert len([d for d in dirs if 'by_mission' in d]) == 3
+
+
+def test_figure_key_covers_the_data_helpers(monkeypatch, tmp_path):
+    chart, data, _, title = chart_jobs(families(), 'out')[0]
+    key = generate_charts.figure_key(chart, data, title)
+    # A copy of the module with an edited helper gives another key for the same chart and data
+    source = tmp_path / 'generate_charts.py'
+    source.write_text(open(generate_charts.__file__).read().replace('index=[', 'index = ['))
+    monkeypatch.setattr(generate_charts.inspect, 'getsourcefile', lambda obj: str(source))
+    assert generate_charts.figure_key(chart, data, title) != key
+
+
+def test_figure_cache_keeps_the_most_recent_figures(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    old = cache_dir / 'old.png'
+    cache_dir.mkdir()
+    old.write_bytes(b'png')
+    os.utime(old, (0, 0))
+
+    stats = render_charts(families(), str(tmp_path / 'figures'), workers=1, cache_dir=str(cache_dir), cache_keep=3)
+
+    assert stats == {'hits': 0, 'misses': 12}
+    assert len(os.listdir(cache_dir)) == 3
+    assert not old.exists()
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pytest
+import history
+import pipeline
+from incremental import FINGERPRINT_COLUMN
+from synthetic_export import generate_export, write_export
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Copy of config.yaml and data/lists in a temporary working directory."""
+    shutil.copy(os.path.join(REPO, 'config.yaml'), tmp_path / 'config.yaml')
+    shutil.copytree(os.path.join(REPO, 'data', 'lists'), tmp_path / 'data' / 'lists')
+    (tmp_path / 'data' / 'raw').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def export(path, rows, seed):
+    write_export(generate_export(rows, seed), path)
+    return str(path)
+
+
+def run(input_path, period, **kwargs):
+    return pipeline.run_pipeline(input_path, period, 'config.yaml', workers=1, **kwargs)
+
+
+def test_fingerprints_stay_out_of_the_delta(workdir):
+    run(export(workdir / 'data' / 'raw' / 'a.csv', 300, 0), '2025_09', incremental_run=True)
+    snapshot = history.read_snapshot('data/history/snapshots', '2025_09')
+    assert FINGERPRINT_COLUMN in snapshot.columns
+
+    current = run(export(workdir / 'data' / 'raw' / 'b.csv', 300, 1), '2025_10')
+
+    tabs = pd.read_excel('data/processed/monthly_update_2025_10.xlsx', sheet_name=None)
+    assert not tabs['DROPPED'].empty
+    assert list(tabs['DROPPED'].columns) == list(current.columns)
+    # Full runs do not fingerprint their snapshot (the history reader unifies schemas, so the column is null)
+    assert history.read_snapshot('data/history/snapshots', '2025_10')[FINGERPRINT_COLUMN].isna().all()
+
+
+def test_coverage_kpi_reads_the_manifest_just_written(workdir):
+    run(export(workdir / 'data' / 'raw' / 'a.csv', 300, 0), '2025_10')
+
+    with open('logs/run_manifest_2025_10.json') as f:
+        manifest = json.load(f)
+    kpis = pd.read_excel('dashboard/Radar_Tecnologico_2025_10.xlsx', sheet_name='Coverage_KPI')
+    values = dict(zip(kpis['KPI'], kpis['Value']))
+    assert values['Total Families'] == manifest['counts']['total']
+    assert values['%M0 (Unmapped)'] == pytest.approx(manifest['mapping']['unmapped_pct'])
+    public = pd.read_excel('dashboard/Radar_Tecnologico_2025_10.xlsx', sheet_name='Public_View')
+    assert len(public) == len(pd.read_csv('data/processed/TRL2-4_Fit_Index_2025_10_public.csv'))
+
+
+@pytest.mark.filterwarnings('error::pandas.errors.SettingWithCopyWarning')
+def test_incremental_run_processes_changed_families_without_warnings(workdir):
+    raw = generate_export(300, 0)
+    write_export(raw, workdir / 'data' / 'raw' / 'a.csv')
+    run('data/raw/a.csv', '2025_09', incremental_run=True)
+    changed = raw.copy()
+    changed.loc[:20, 'Patent Valuation Score Legal'] = '99.0%'
+    write_export(changed, workdir / 'data' / 'raw' / 'b.csv')
+
+    incremental_df = run('data/raw/b.csv', '2025_10', incremental_run=True)
+    full_df = run('data/raw/b.csv', '2025_11')
+
+    columns = ['family_key', 'TRL_Fit_Index', 'TRL_Category', 'VB_Eligible']
+    pd.testing.assert_frame_equal(incremental_df[columns], full_df[columns])
@@ -0,0 +1,30 @@
+import os
+import pandas as pd
+from stage_cache import run_stage
+
+
+def entries(cache_dir, stage):
+    return sorted(os.listdir(os.path.join(cache_dir, stage)))
+
+
+def test_run_stage_keeps_the_most_recent_keys(tmp_path):
+    cache_dir = str(tmp_path)
+    for i, key in enumerate(['k1', 'k2', 'k3']):
+        run_stage(cache_dir, 'fit_index', key, lambda: pd.DataFrame({'x': [i]}), keep=2)
+        os.utime(os.path.join(cache_dir, 'fit_index', f"{key}.pkl"), (i, i))
+    assert entries(cache_dir, 'fit_index') == ['k2.pkl', 'k3.pkl']
+
+    # A hit marks the entry as used, so the next write evicts k3 instead of k2
+    assert run_stage(cache_dir, 'fit_index', 'k2', lambda: None, keep=2)['x'].tolist() == [1]
+    run_stage(cache_dir, 'fit_index', 'k4', lambda: pd.DataFrame({'x': [3]}), keep=2)
+    assert entries(cache_dir, 'fit_index') == ['k2.pkl', 'k4.pkl']
+
+
+def test_pruning_is_per_stage(tmp_path):
+    cache_dir = str(tmp_path)
+    run_stage(cache_dir, 'cleaned', 'a', lambda: pd.DataFrame({'x': [0]}), keep=1)
+    run_stage(cache_dir, 'flags', 'b', lambda: pd.DataFrame({'x': [0]}), keep=1)
+    os.utime(os.path.join(cache_dir, 'flags', 'b.pkl'), (0, 0))
+    run_stage(cache_dir, 'flags', 'c', lambda: pd.DataFrame({'x': [0]}), keep=1)
+    assert entries(cache_dir, 'cleaned') == ['a.pkl']
+    assert entries(cache_dir, 'flags') == ['c.pkl']